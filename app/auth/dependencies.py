@@ -1,3 +1,4 @@
+import uuid
 from typing import Any, List
 
 from fastapi.security import HTTPBearer
@@ -9,7 +10,8 @@ from app.db.redis import token_in_blocklist
 from sqlmodel.ext.asyncio.session import AsyncSession
 from app.db.session import get_session
 from app.auth.services import UserService
-from app.db.models import User
+from app.auth.principals import principal_cache
+from app.auth.schemas import PrincipalModel
 
 user_service = UserService()
 
@@ -21,36 +23,29 @@ class TokenBearer(HTTPBearer):
     async def __call__(self, request: Request) -> HTTPAuthorizationCredentials | None:
         creds = await super().__call__(request)
         token = creds.credentials
-        token_data = decode_token(token)
-        if not self.token_valid(token):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={
-                    "message": "Token is invalid Or expired",
-                    "resolution": "Please get new token",
-                    "error_code": "invalid_token",
-                },
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        if await token_in_blocklist(token_data["jti"]):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={
-                    "message": "Token is invalid Or expired",
-                    "resolution": "Please get new token",
-                    "error_code": "invalid_token",
-                },
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+
+        # Routes can depend on several bearers, the token is checked once
+        verified = getattr(request.state, "verified_token", None)
+        if verified is not None and verified[0] == token:
+            token_data = verified[1]
+        else:
+            token_data = decode_token(token)
+            if token_data is None or await token_in_blocklist(token_data["jti"]):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail={
+                        "message": "Token is invalid Or expired",
+                        "resolution": "Please get new token",
+                        "error_code": "invalid_token",
+                    },
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            request.state.verified_token = (token, token_data)
 
         self.verify_token_data(token_data)
 
         return token_data
 
-    def token_valid(self, token: str) -> bool:
-        token_data = decode_token(token)
-        return token_data is not None
-
     def verify_token_data(self, token_data):
         raise NotImplementedError("Please Override this method in child classes")
 
@@ -81,20 +76,30 @@ class RefreshTokenBearer(TokenBearer):
             )
 
 
+# Shared by every route, so FastAPI resolves it once per request
+access_token_bearer = AccessTokenBearer()
+
+
 async def get_current_user(
-    token_details: dict = Depends(AccessTokenBearer()),
+    token_details: dict = Depends(access_token_bearer),
     session: AsyncSession = Depends(get_session),
 ):
-    user_email = token_details["user"]["email"]
-    user = await user_service.get_user_by_email(user_email, session)
-    return user
+    user_id = token_details["user"]["user_id"]
+    principal = await principal_cache.get(user_id)
+    if principal is None:
+        # Taken before the query, an update committed meanwhile wins
+        generation = await principal_cache.generation(user_id)
+        user = await user_service.get_user_by_id(uuid.UUID(user_id), session)
+        if user is not None:
+            principal = await principal_cache.set(user, generation)
+    return principal
 
 
 class RoleChecker:
     def __init__(self, allowed_roles: List[str]) -> None:
         self.allowed_roles = allowed_roles
 
-    def __call__(self, current_user: User = Depends(get_current_user)) -> Any:
+    def __call__(self, current_user: PrincipalModel = Depends(get_current_user)) -> Any:
         if not current_user.is_verified:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
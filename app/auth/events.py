@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import orjson
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.auth.principals import principal_cache
+from app.db.redis import (
+    AUTH_EVENTS_CHANNEL,
+    load_blocklist,
+    redis_client,
+    revoked_tokens,
+)
+
+PING_INTERVAL = 30
+
+
+def handle_auth_event(event: dict) -> None:
+    if event["type"] == "revoke":
+        revoked_tokens.add(event["jti"], event["expires_at"])
+    elif event["type"] == "principal":
+        principal_cache.forget(event["user_id"])
+
+
+async def listen_auth_events() -> None:
+    """Keep this worker's revocation set and principal cache in sync.
+
+    The blocklist is reloaded after subscribing, so no revocation falls in
+    between. While the subscription is down, blocklist lookups go to Redis.
+    """
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(AUTH_EVENTS_CHANNEL)
+            await load_blocklist()
+            revoked_tokens.synced = True
+            last_ping = time.monotonic()
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is not None:
+                    # A bad message is skipped, later revocations still apply
+                    try:
+                        handle_auth_event(orjson.loads(message["data"]))
+                    except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+                        logger.warning(
+                            "Malformed auth event {!r}: {}", message["data"], e
+                        )
+                # A silently dropped connection would otherwise go unnoticed
+                if time.monotonic() - last_ping > PING_INTERVAL:
+                    await pubsub.ping()
+                    revoked_tokens.purge()
+                    last_ping = time.monotonic()
+        except (RedisError, OSError) as e:
+            logger.warning("Auth events subscription failed: {}", e)
+            await asyncio.sleep(1)
+        finally:
+            revoked_tokens.synced = False
+            await pubsub.aclose()
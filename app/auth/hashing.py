@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from app.auth.utils import pwd_context
+from app.config import Config
+from app.executors import BoundedExecutor
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already waiting for a worker."""
+
+
+class PasswordHasher(BoundedExecutor):
+    """Bounded thread pool for bcrypt, so logins never hash on the event loop.
+
+    bcrypt releases the GIL, so `max_workers` hashes run in parallel while
+    detection requests keep being served. At most `max_queue` further calls
+    wait for a worker, the rest are rejected with PasswordHasherBusy.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 64) -> None:
+        super().__init__(
+            make_pool=partial(ThreadPoolExecutor, thread_name_prefix="bcrypt"),
+            name="Password hashing",
+            queue_full=PasswordHasherBusy,
+            max_workers=max_workers,
+            max_queue=max_queue,
+        )
+        self._rehashed = 0
+
+    async def hash(self, password: str) -> str:
+        return await self.call(pwd_context.hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        """Verify a password, the second item is a new hash when the cost changed."""
+        valid, new_hash = await self.call(
+            pwd_context.verify_and_update, password, hashed_password
+        )
+        if new_hash is not None:
+            self._rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        return {**super().stats(), "rehashed": self._rehashed}
+
+
+password_hasher = PasswordHasher(
+    max_workers=Config.BCRYPT_WORKERS, max_queue=Config.BCRYPT_MAX_QUEUE
+)
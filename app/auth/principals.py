@@ -0,0 +1,125 @@
+import time
+from collections import OrderedDict
+
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.config import Config
+from app.auth.schemas import PrincipalModel
+from app.db.models import User
+from app.db.redis import publish_auth_event, redis_client
+
+
+# Stores a principal unless the user was invalidated after it was read
+STORE_IF_CURRENT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def principal_key(user_id: str) -> str:
+    return f"principal:{user_id}"
+
+
+def generation_key(user_id: str) -> str:
+    return f"principal:{user_id}:generation"
+
+
+class PrincipalCache:
+    """Authenticated users by id, so protected routes skip the users query.
+
+    The first tier is an in-process LRU whose entries live `local_ttl`
+    seconds, the second is Redis shared by every worker. `invalidate` drops
+    the Redis entry and tells every worker to forget its local one, should
+    that message be lost the entry still expires after `local_ttl`. Only
+    the fields of PrincipalModel are cached, never the password hash.
+
+    Every invalidation bumps a per-user generation. Callers read it with
+    `generation` before loading the user and pass it to `set`, which drops
+    the row if the user was updated in between, so a request that read the
+    row just before an update can not put the old role back.
+    """
+
+    def __init__(self, max_entries: int, local_ttl: int, ttl: int) -> None:
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._store_if_current = None
+
+    def _remember(self, user_id: str, data: bytes) -> None:
+        self._entries[user_id] = (time.monotonic() + self.local_ttl, data)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, user_id: str) -> PrincipalModel | None:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            return PrincipalModel.model_validate_json(entry[1])
+
+        try:
+            data = await redis_client.get(principal_key(user_id))
+        except RedisError as e:
+            logger.warning("Principal cache lookup failed: {}", e)
+            return None
+        if data is None:
+            return None
+        self._remember(user_id, data)
+        return PrincipalModel.model_validate_json(data)
+
+    async def generation(self, user_id: str) -> bytes:
+        try:
+            return await redis_client.get(generation_key(user_id)) or b""
+        except RedisError as e:
+            logger.warning("Principal generation lookup failed: {}", e)
+            return b""
+
+    async def set(
+        self, user: User | PrincipalModel, generation: bytes
+    ) -> PrincipalModel:
+        """Cache a user read after `generation` was taken, unless it is stale."""
+        principal = PrincipalModel.model_validate(user)
+        user_id = str(principal.uid)
+        data = principal.model_dump_json().encode()
+        if self._store_if_current is None:
+            self._store_if_current = redis_client.register_script(STORE_IF_CURRENT)
+        try:
+            stored = await self._store_if_current(
+                keys=[principal_key(user_id), generation_key(user_id)],
+                args=[generation, data, self.ttl],
+            )
+        except RedisError as e:
+            logger.warning("Principal cache store failed: {}", e)
+            return principal
+        if stored:
+            self._remember(user_id, data)
+        return principal
+
+    def forget(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+
+    async def invalidate(self, user_id) -> None:
+        user_id = str(user_id)
+        self.forget(user_id)
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(principal_key(user_id))
+                pipe.incr(generation_key(user_id))
+                # Only has to outlive the requests that read the old row
+                pipe.expire(generation_key(user_id), self.ttl)
+                await pipe.execute()
+            await publish_auth_event({"type": "principal", "user_id": user_id})
+        except RedisError as e:
+            logger.warning("Principal cache invalidation failed: {}", e)
+
+
+principal_cache = PrincipalCache(
+    max_entries=Config.PRINCIPAL_CACHE_MAX_ENTRIES,
+    local_ttl=Config.PRINCIPAL_CACHE_LOCAL_TTL,
+    ttl=Config.PRINCIPAL_CACHE_TTL,
+)
@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from datetime import timedelta, datetime, timezone
 
 from fastapi import APIRouter, status, Depends, HTTPException
@@ -12,29 +13,43 @@ from app.auth.schemas import (
 from app.auth.utils import (
     create_url_safe_token,
     decode_url_safe_token,
-    verify_password,
     create_access_token,
-    generate_hashed_password,
 )
+from app.auth.hashing import password_hasher, PasswordHasherBusy
 from app.auth.dependencies import (
     RefreshTokenBearer,
-    AccessTokenBearer,
+    access_token_bearer,
     get_current_user,
     RoleChecker,
 )
 from app.db.redis import add_jti_to_blocklist
 from sqlmodel.ext.asyncio.session import AsyncSession
 from app.celery_tasks import send_email
+from app.mail_delivery import get_mail_stats
 from app.config import Config
 from app.db.session import get_session
 
 auth_router = APIRouter()
 user_service = UserService()
-access_token_bearer = AccessTokenBearer()
 role_checker = Depends(RoleChecker(["admin", "user"]))
 role_checker_admin = Depends(RoleChecker(["admin"]))
 
 
+@contextmanager
+def password_hashing():
+    try:
+        yield
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "message": "Authentication service is busy",
+                "resolution": "Please try again in a moment",
+                "error_code": "password_hashing_busy",
+            },
+        )
+
+
 @auth_router.post("/signup", status_code=status.HTTP_201_CREATED)
 async def create_user_account(
     user_data: UserCreateModel,
@@ -60,7 +75,8 @@ async def create_user_account(
                 "error_code": "usrename_exists",
             },
         )
-    new_user = await user_service.create_user(user_data, session)
+    with password_hashing():
+        new_user = await user_service.create_user(user_data, session)
     token = create_url_safe_token({"email": email})
     link = f"http://{Config.DOMAIN}/api/v1/auth/verify/{token}"
     html = f"""
@@ -104,10 +120,13 @@ async def verify_user_account(token: str, session: AsyncSession = Depends(get_se
 
 @auth_router.post("/login")
 async def login_users(
-    login_data: UserLoginModel, session: AsyncSession = Depends(get_session)
+    login_data: UserLoginModel,
+    session: AsyncSession = Depends(get_session),
 ):
     email = login_data.email
     password = login_data.password
+    # Credentials are read from the primary, a lagging replica would still
+    # accept a password that was just changed
     user = await user_service.get_user_by_email(email, session)
     if not user:
         raise HTTPException(
@@ -116,8 +135,16 @@ async def login_users(
             headers={"WWW-Authenticate": "Bearer"},
         )
     if user is not None:
-        password_valid = verify_password(password, user.hashed_password)
+        with password_hashing():
+            password_valid, new_hash = await password_hasher.verify_and_update(
+                password, user.hashed_password
+            )
         if password_valid:
+            if new_hash is not None:
+                # BCRYPT_ROUNDS changed since this hash was made, upgrade it
+                await user_service.update_user(
+                    user, {"hashed_password": new_hash}, session
+                )
             access_token_expires = timedelta(
                 minutes=Config.ACCESS_TOKEN_EXPIRES_MINUTES
             )
@@ -176,7 +203,7 @@ async def get_current_user(user=Depends(get_current_user)):
 
 
 @auth_router.get("/logout")
-async def revoke_token(token_details: dict = Depends(AccessTokenBearer())):
+async def revoke_token(token_details: dict = Depends(access_token_bearer)):
     jti = token_details["jti"]
     await add_jti_to_blocklist(jti)
     return JSONResponse(
@@ -184,6 +211,16 @@ async def revoke_token(token_details: dict = Depends(AccessTokenBearer())):
     )
 
 
+@auth_router.get("/password-hashing", dependencies=[role_checker_admin])
+async def get_password_hashing_stats():
+    return password_hasher.stats()
+
+
+@auth_router.get("/mail/stats", dependencies=[role_checker_admin])
+async def read_mail_stats():
+    return await get_mail_stats()
+
+
 @auth_router.post("/password-reset-request")
 async def password_reset_request(email_data: PasswordResetRequestModel):
     email = email_data.email
@@ -228,7 +265,8 @@ async def reset_account_password(
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bear"},
             )
-        hashed_password = generate_hashed_password(new_password)
+        with password_hashing():
+            hashed_password = await password_hasher.hash(new_password)
         await user_service.update_user(
             user, {"hashed_password": hashed_password}, session
         )
@@ -1,4 +1,7 @@
-from pydantic import BaseModel, Field
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
 from app.config import Config
 
 
@@ -22,6 +25,21 @@ class UserCreateModel(BaseModel):
     )
 
 
+class PrincipalModel(BaseModel):
+    """The authenticated user as cached by PrincipalCache, without credentials."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    uid: uuid.UUID
+    username: str
+    email: str
+    first_name: str
+    last_name: str
+    role: str
+    is_verified: bool
+    created_at: datetime | None = None
+
+
 class EmailModel(BaseModel):
     addresses: list[str]
 
@@ -6,7 +6,8 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 from app.db.models import User
 from app.auth.schemas import UserCreateModel, AdminCreateModel
-from app.auth.utils import generate_hashed_password
+from app.auth.hashing import password_hasher
+from app.auth.principals import principal_cache
 
 
 class UserService:
@@ -16,6 +17,12 @@ class UserService:
         user = results.first()
         return user
 
+    async def get_user_by_id(self, user_id: uuid.UUID, session: AsyncSession):
+        statement = select(User).where(User.uid == user_id)
+        results = await session.exec(statement)
+        user = results.first()
+        return user
+
     async def user_exists(self, email: str, session: AsyncSession):
         user = await self.get_user_by_email(email, session)
         return True if user is not None else False
@@ -31,7 +38,7 @@ class UserService:
         return True if user is not None else False
 
     async def create_user(self, user_data: UserCreateModel, session: AsyncSession):
-        hashed_password = generate_hashed_password(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
         user_data_dict = user_data.model_dump(exclude={"password"})
         new_user = User(**user_data_dict, hashed_password=hashed_password)
         new_user.role = "user"
@@ -46,6 +53,8 @@ class UserService:
             setattr(user, k, v)
         session.add(user)
         await session.commit()
+        # role, verification or password may have changed, reload on next use
+        await principal_cache.invalidate(user.uid)
         await session.refresh(user)
         return user
 
@@ -60,7 +69,7 @@ class AdminService(UserService):
         admin_name_exists = await self.username_exists(admin_name, session)
         if admin_name_exists:
             return "Admin name already exists"
-        hashed_password = generate_hashed_password(admin_data.password)
+        hashed_password = await password_hasher.hash(admin_data.password)
         user_data_dict = admin_data.model_dump(exclude={"password"})
         new_admin = User(**user_data_dict, hashed_password=hashed_password)
         new_admin.role = "admin"
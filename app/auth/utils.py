@@ -1,39 +1,78 @@
+import hashlib
 import logging
+import time
 import uuid
+from collections import OrderedDict
 
 import jwt
-from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from datetime import timedelta, timezone, datetime
 from app.config import Config
-from fastapi import HTTPException, status
+from fastapi import HTTPException
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 
 
 pwd_context = CryptContext(
     schemes=["bcrypt"],
-    # deprecated="auto"
+    bcrypt__default_rounds=Config.BCRYPT_ROUNDS,
+    # hashes with any other cost are flagged for a rehash by verify_and_update
+    bcrypt__min_desired_rounds=Config.BCRYPT_ROUNDS,
+    bcrypt__max_desired_rounds=Config.BCRYPT_ROUNDS,
 )
 
 
-def decode_token(token: str) -> dict:
+class VerifiedTokenCache:
+    """Claims of recently verified tokens, keyed by a digest of the token.
+
+    A hit skips the signature check, entries are dropped once the token's
+    `exp` has passed. The cached claims are shared, callers must not modify
+    them.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, dict] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self._key(token)
+        claims = self._entries.get(key)
+        if claims is None:
+            return None
+        if claims["exp"] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def set(self, token: str, claims: dict) -> None:
+        if "exp" not in claims:
+            return
+        self._entries[self._key(token)] = claims
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+verified_tokens = VerifiedTokenCache(max_entries=Config.TOKEN_CACHE_MAX_ENTRIES)
+
+
+def decode_token(token: str) -> dict | None:
+    """Return the claims of a valid token, None when it is invalid or expired."""
+    token_data = verified_tokens.get(token)
+    if token_data is not None:
+        return token_data
     try:
         token_data = jwt.decode(
             jwt=token, key=Config.JWT_SECRET, algorithms=[Config.JWT_ALGORITHM]
         )
-        return token_data
     except jwt.PyJWTError as e:
-        logging.exception(e)
+        logging.info("Rejected token: %s", e)
         return None
-
-
-def generate_hashed_password(password: str) -> str:
-    hashed_password = pwd_context.hash(password)
-    return hashed_password
-
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    verified_tokens.set(token, token_data)
+    return token_data
 
 
 def create_access_token(
@@ -60,22 +99,6 @@ def create_access_token(
     return access_token
 
 
-def decode_token(token: str) -> dict:
-    try:
-        token_data = jwt.decode(
-            token, key=Config.JWT_SECRET, algorithms=[Config.JWT_ALGORITHM]
-        )
-
-        return token_data
-
-    except InvalidTokenError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail={"Could not validate credentials"},
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-
 serializer = URLSafeTimedSerializer(
     secret_key=Config.JWT_SECRET, salt="email-configuration"
 )
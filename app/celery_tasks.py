@@ -1,15 +1,117 @@
+import uuid
+
 from celery import Celery
-from app.mail import mail, create_message
+from celery.signals import worker_process_init, worker_process_shutdown
+from loguru import logger
+from redis import Redis
+from app.mail_delivery import MailDelivery, SmtpConnection
 from asgiref.sync import async_to_sync
-from app.config import broker_url, result_backend
+from app.config import Config, broker_url, result_backend
+from app.db.session import WorkerSessionLocal
+from app.object_detection.jobs import DetectionJobService
 
 
 c_app = Celery("worker", broker=broker_url, backend=result_backend)
 c_app.config_from_object("app.config")
 
+job_service = DetectionJobService()
+job_store = Redis.from_url(Config.REDIS_URL)
+mail_delivery = MailDelivery(
+    client=job_store,
+    connection=SmtpConnection(
+        timeout=Config.MAIL_SMTP_TIMEOUT,
+        idle_timeout=Config.MAIL_SMTP_IDLE_TIMEOUT,
+        max_messages=Config.MAIL_MAX_MESSAGES_PER_CONNECTION,
+    ),
+    batch_size=Config.MAIL_BATCH_SIZE,
+    max_attempts=Config.MAIL_MAX_ATTEMPTS,
+    retry_backoff=Config.MAIL_RETRY_BACKOFF,
+    retry_backoff_max=Config.MAIL_RETRY_BACKOFF_MAX,
+    claim_idle_ms=Config.MAIL_CLAIM_IDLE_MS,
+)
+
+# Loaded once per inference worker process, see get_yolo_services()
+_yolo_services = None
+
+
+def get_yolo_services():
+    global _yolo_services
+    if _yolo_services is None:
+        from app.object_detection.services import YoloServices
+
+        _yolo_services = YoloServices()
+    return _yolo_services
+
+
+@worker_process_init.connect
+def preload_model(**kwargs):
+    if Config.INFERENCE_WORKER_PRELOAD:
+        yolo_services = get_yolo_services()
+        if Config.MODEL_WARMUP:
+            yolo_services.warmup()
+
+
+@worker_process_shutdown.connect
+def close_smtp_connection(**kwargs):
+    mail_delivery.connection.close()
+
 
 @c_app.task()
-def send_email(recipients: list[str], subject: str, body: str):
-    message = create_message(recipients, subject=subject, body=body)
-    async_to_sync(mail.send_message)(message)
-    print("Email sent")
+def send_email(recipients: list[str] | str, subject: str, body: str):
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    mail_delivery.enqueue(recipients, subject, body)
+    # Whatever is queued meanwhile goes out in the same batches
+    drain_outbox()
+
+
+@c_app.task()
+def drain_outbox():
+    retry_in = mail_delivery.drain()
+    if retry_in is not None:
+        drain_outbox.apply_async(countdown=retry_in)
+
+
+async def save_job_output(
+    user_id: uuid.UUID,
+    total_objects: int,
+    sample_name: str,
+    detections: bytes | None = None,
+):
+    async with WorkerSessionLocal() as session:
+        await get_yolo_services().save_yolo_output(
+            session=session,
+            user_id=user_id,
+            total_objects=total_objects,
+            sample_name=sample_name,
+            detections=detections,
+        )
+
+
+@c_app.task()
+def detect_objects(job_id: str):
+    job = job_service.get_job_sync(job_store, job_id)
+    if job is None:
+        return
+    binary_image = job_service.load_job_image(job_store, job_id)
+    if binary_image is None:
+        job_service.fail_job(job_store, job_id, "Job expired before it was processed")
+        return
+
+    try:
+        predict, final_image = get_yolo_services().detect_and_annotate(
+            binary_image, profile=job.get("profile") or None
+        )
+        total_objects = len(predict)
+        async_to_sync(save_job_output)(
+            uuid.UUID(job["user_id"]),
+            total_objects,
+            job["sample_name"] or None,
+            get_yolo_services().dump_detections(predict),
+        )
+    except Exception as e:
+        job_service.fail_job(job_store, job_id, str(e))
+        raise
+
+    job_service.complete_job(job_store, job_id, total_objects, final_image)
+    logger.info("Detection job {} done: {} objects", job_id, total_objects)
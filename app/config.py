@@ -1,3 +1,4 @@
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
 
@@ -5,8 +6,22 @@ current_path = Path(__file__).resolve()
 env_path = current_path.parent.parent / ".env"
 
 
+class InferenceProfile(BaseModel):
+    image_size: int = 640
+    conf: float = 0.5
+    augment: bool = False
+    max_det: int = 300
+
+
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Optional read replica for history, stats and login lookups
+    DATABASE_READ_URL: str | None = None
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
     JWT_SECRET: str
     JWT_ALGORITHM: str
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -18,13 +33,86 @@ class Settings(BaseSettings):
     MAIL_FROM_NAME: str
     MAIL_STARTTLS: bool = True
     MAIL_SSL_TLS: bool = False
+    # MAIL DELIVERY CONFIG
+    MAIL_BATCH_SIZE: int = 50
+    MAIL_MAX_ATTEMPTS: int = 5
+    MAIL_RETRY_BACKOFF: int = 30  # doubled after every failed attempt
+    MAIL_RETRY_BACKOFF_MAX: int = 1800
+    MAIL_CLAIM_IDLE_MS: int = 300000
+    MAIL_SMTP_TIMEOUT: int = 30
+    MAIL_SMTP_IDLE_TIMEOUT: int = 60
+    MAIL_MAX_MESSAGES_PER_CONNECTION: int = 100
     USE_CREDENTIALS: bool = True
     VALIDATE_CERTS: bool = True
     DOMAIN: str
     ACCESS_TOKEN_EXPIRES_MINUTES: int
     ACCESS_TOKEN_EXPIRES_DEFAULT: int
     REFRESH_TOKEN_EXPIRES_DAYS_DEFAULT: int
+    # AUTH CACHE CONFIG
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    PRINCIPAL_CACHE_LOCAL_TTL: int = 30
+    PRINCIPAL_CACHE_TTL: int = 300
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    # PASSWORD HASHING CONFIG
+    BCRYPT_ROUNDS: int = 12  # existing hashes are upgraded on the next login
+    BCRYPT_WORKERS: int = 2
+    BCRYPT_MAX_QUEUE: int = 64
     MODEL_PATH: str
+    # INFERENCE CONFIG
+    INFERENCE_BACKEND: str = "torch"  # "torch", "onnx" or "openvino"
+    MODEL_LOAD_MODE: str = "eager"  # "eager", "lazy" or "preload" (Gunicorn)
+    MODEL_WARMUP: bool = True
+    MODEL_KEEP_PREVIOUS: int = 1  # versions kept loaded for instant rollback
+    # POST /models only loads weights from here, defaults to MODEL_PATH's directory
+    MODEL_DIR: str | None = None
+    WEB_WORKERS: int = 2
+    INFERENCE_THREADS_PER_WORKER: int | None = None  # cpu count / WEB_WORKERS
+    INFERENCE_INT8: bool = False
+    INFERENCE_INT8_DATA: str | None = None  # calibration dataset for OpenVINO INT8
+    MODEL_EXPORT_DIR: str | None = None
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_WAIT_MS: int = 10
+    INFERENCE_EXECUTOR: str = "thread"  # "thread" or "process"
+    INFERENCE_WORKERS: int = 8
+    INFERENCE_MAX_QUEUE: int = 32
+    INFERENCE_WORKER_PRELOAD: bool = False
+    DETECTION_JOB_TTL: int = 86400
+    DETECTION_CACHE_ENABLED: bool = True
+    DETECTION_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    DETECTION_CACHE_TTL: int = 86400
+    DETECTION_CACHE_STORE_IMAGES: bool = True
+    MAX_IMAGE_PIXELS: int = 50_000_000
+    MAX_UPLOAD_BYTES: int = 32 * 1024 * 1024
+    MAX_BATCH_UPLOAD_BYTES: int = 512 * 1024 * 1024
+    BATCH_MAX_IMAGES: int = 64
+    BATCH_DECODE_WORKERS: int = 4
+    TILE_SIZE: int = 640
+    TILE_OVERLAP: float = 0.2
+    TILE_MAX_COUNT: int = 16
+    TILE_NMS_IOU: float = 0.5
+    # Ordered from cheapest to most expensive, roles are capped by position
+    INFERENCE_PROFILES: dict[str, InferenceProfile] = {
+        "fast": InferenceProfile(image_size=480, augment=False),
+        "balanced": InferenceProfile(image_size=640, augment=False),
+        "accurate": InferenceProfile(image_size=640, augment=True),
+    }
+    INFERENCE_DEFAULT_PROFILE: str = "accurate"
+    INFERENCE_ROLE_MAX_PROFILE: dict[str, str] = {
+        "admin": "accurate",
+        "user": "accurate",
+    }
+    DETECTION_STORE_BOXES: bool = True
+    BBOX_LABEL_MODE: str = "none"  # "none", "class" or "confidence"
+    BBOX_LINE_WIDTH: int | None = None
+    # HISTORY CONFIG
+    HISTORY_PAGE_SIZE: int = 50
+    HISTORY_MAX_PAGE_SIZE: int = 500
+    EXPORT_CHUNK_ROWS: int = 5000
+    # WRITE-BEHIND CONFIG
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_BATCH_SIZE: int = 200
+    WRITE_BEHIND_FLUSH_MS: int = 200
+    WRITE_BEHIND_CLAIM_IDLE_MS: int = 60000
     # ADMIN CONFIG
     FIRST_NAME: str
     LAST_NAME: str
@@ -40,3 +128,4 @@ Config = Settings()
 broker_url = Config.REDIS_URL
 result_backend = Config.REDIS_URL
 broker_connection_retry_on_startup = True
+task_routes = {"app.celery_tasks.detect_objects": {"queue": "inference"}}
@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
-from sqlalchemy.dialects.mysql import VARCHAR, TIMESTAMP, BOOLEAN
+from sqlalchemy import Index
+from sqlalchemy.dialects.mysql import BIGINT, MEDIUMBLOB, VARCHAR, TIMESTAMP, BOOLEAN
 from sqlmodel import SQLModel, Field, Column, Relationship
 
 import uuid
@@ -35,6 +36,11 @@ class User(SQLModel, table=True):
 
 class YoloOutput(SQLModel, table=True):
     __tablename__ = "yolo_outputs"
+    # Keyset pagination of the history, newest first, see pagination.py
+    __table_args__ = (
+        Index("ix_yolo_outputs_created_at_uid", "created_at", "uid"),
+        Index("ix_yolo_outputs_user_id_created_at_uid", "user_id", "created_at", "uid"),
+    )
 
     uid: uuid.UUID = Field(
         default_factory=uuid.uuid4,
@@ -43,9 +49,32 @@ class YoloOutput(SQLModel, table=True):
     )
     sample_name: str | None = Field(default=None)
     total_objects: int
+    # DetectionResult.to_bytes(), NULL for outputs saved before it was kept
+    detections: bytes | None = Field(
+        default=None, sa_column=Column(MEDIUMBLOB, nullable=True)
+    )
     user_id: uuid.UUID = Field(foreign_key="users.uid", nullable=False)
     created_at: datetime = Field(
         sa_column=Column(TIMESTAMP, nullable=False, default=datetime.now)
     )
 
     user: Optional[User] = Relationship(back_populates="yolo_outputs")
+
+
+class DetectionDailyStats(SQLModel, table=True):
+    """Per user, day and sample name rollup of yolo_outputs.
+
+    Updated in the same transaction as every insert into yolo_outputs, see
+    app/object_detection/rollup.py.
+    """
+
+    __tablename__ = "detection_daily_stats"
+    __table_args__ = (Index("ix_detection_daily_stats_day", "day"),)
+
+    user_id: uuid.UUID = Field(foreign_key="users.uid", primary_key=True)
+    day: date = Field(primary_key=True)
+    # Primary key columns can't be NULL, "" stands for outputs without a name
+    sample_name: str = Field(default="", primary_key=True)
+    output_count: int = Field(default=0)
+    total_objects_sum: int = Field(sa_column=Column(BIGINT, nullable=False, default=0))
+    total_objects_max: int = Field(default=0)
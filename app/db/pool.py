@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolStats:
+    """Checkouts, new connections and checkout waits of one connection pool."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self._waits: deque = deque(maxlen=window)
+        self._checkouts = 0
+        self._connects = 0
+        self._invalidated = 0
+        self._timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._waits.append(seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self._timeouts += 1
+
+    def record_checkout(self) -> None:
+        with self._lock:
+            self._checkouts += 1
+
+    def record_connect(self) -> None:
+        with self._lock:
+            self._connects += 1
+
+    def record_invalidated(self) -> None:
+        with self._lock:
+            self._invalidated += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            result = {
+                "checkouts": self._checkouts,
+                # grows with every reconnect, high values mean connection churn
+                "connects": self._connects,
+                "invalidated": self._invalidated,
+                "timeouts": self._timeouts,
+            }
+        n = len(waits)
+        if n:
+            result.update(
+                wait_mean_ms=sum(waits) / n * 1000,
+                wait_p95_ms=waits[int(0.95 * (n - 1))] * 1000,
+                wait_max_ms=waits[-1] * 1000,
+            )
+        return result
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that measures how long a checkout waits for a connection."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.pool_stats = PoolStats()
+
+    def _do_get(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            connection = super()._do_get(*args, **kwargs)
+        except exc.TimeoutError:
+            # DB_POOL_TIMEOUT passed without a free connection
+            self.pool_stats.record_timeout()
+            raise
+        self.pool_stats.record_wait(time.perf_counter() - start_time)
+        return connection
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        # counters survive a pool reset after a disconnect
+        pool.pool_stats = self.pool_stats
+        return pool
+
+
+def instrument_pool(engine: AsyncEngine) -> None:
+    # Listeners on the engine are carried over when the pool is recreated
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        engine.sync_engine.pool.pool_stats.record_connect()
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        engine.sync_engine.pool.pool_stats.record_checkout()
+
+    @event.listens_for(engine.sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        engine.sync_engine.pool.pool_stats.record_invalidated()
+
+
+def pool_status(engine: AsyncEngine) -> dict:
+    pool = engine.sync_engine.pool
+    status = {"url": engine.url.render_as_string(hide_password=True)}
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            **pool.pool_stats.stats(),
+        )
+    return status
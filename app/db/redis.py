@@ -1,16 +1,82 @@
+import time
+
+import orjson
 import redis.asyncio as aioredis
 from app.config import Config
 
 JTI_EXPIRY = 3600
+# Sorted set of revoked jtis scored by expiry, reloaded by workers on (re)connect
+BLOCKLIST_KEY = "token_blocklist:revoked"
+AUTH_EVENTS_CHANNEL = "auth_events"
+
+redis_client = aioredis.from_url(Config.REDIS_URL)
+token_blocklist = redis_client
+
+
+class RevocationSet:
+    """In-process copy of the token blocklist.
+
+    Filled from BLOCKLIST_KEY and kept current by the revocations published
+    on AUTH_EVENTS_CHANNEL, see app/auth/events.py. It is only trusted while
+    `synced`, i.e. while this worker is subscribed, otherwise lookups go to
+    Redis.
+    """
+
+    def __init__(self) -> None:
+        self._expires: dict[str, float] = {}
+        self.synced = False
+
+    def add(self, jti: str, expires_at: float) -> None:
+        self._expires[jti] = expires_at
+
+    def replace(self, entries: dict[str, float]) -> None:
+        self._expires = entries
+
+    def purge(self) -> None:
+        now = time.time()
+        self._expires = {j: e for j, e in self._expires.items() if e > now}
 
-token_blocklist = aioredis.from_url(Config.REDIS_URL)
+    def __contains__(self, jti: str) -> bool:
+        expires_at = self._expires.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+
+revoked_tokens = RevocationSet()
+
+
+async def publish_auth_event(event: dict) -> None:
+    await redis_client.publish(AUTH_EVENTS_CHANNEL, orjson.dumps(event))
 
 
 async def add_jti_to_blocklist(jti: str) -> None:
-    await token_blocklist.set(name=jti, value="", ex=JTI_EXPIRY)
+    now = time.time()
+    expires_at = now + JTI_EXPIRY
+    async with token_blocklist.pipeline(transaction=True) as pipe:
+        pipe.set(name=jti, value="", ex=JTI_EXPIRY)
+        pipe.zadd(BLOCKLIST_KEY, {jti: expires_at})
+        pipe.zremrangebyscore(BLOCKLIST_KEY, "-inf", now)
+        pipe.publish(
+            AUTH_EVENTS_CHANNEL,
+            orjson.dumps({"type": "revoke", "jti": jti, "expires_at": expires_at}),
+        )
+        await pipe.execute()
+    revoked_tokens.add(jti, expires_at)
+
+
+async def load_blocklist() -> None:
+    entries = await token_blocklist.zrangebyscore(
+        BLOCKLIST_KEY, time.time(), "+inf", withscores=True
+    )
+    revoked_tokens.replace({jti.decode(): expires_at for jti, expires_at in entries})
 
 
 async def token_in_blocklist(jti: str) -> bool:
+    if revoked_tokens.synced:
+        return jti in revoked_tokens
+
     jti = await token_blocklist.get(jti)
 
     return jti is not None
@@ -1,17 +1,54 @@
 from sqlmodel import SQLModel
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.config import Config
+from app.db.pool import InstrumentedQueuePool, instrument_pool
+
+
+def create_pooled_engine(url: str):
+    engine = create_async_engine(
+        url=url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        # MySQL closes idle connections after wait_timeout
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+    )
+    instrument_pool(engine)
+    return engine
+
 
 # Create the database engine
-engine = create_async_engine(url=Config.DATABASE_URL)
+engine = create_pooled_engine(Config.DATABASE_URL)
+
+# Read-only queries go to the replica when one is configured
+read_engine = (
+    create_pooled_engine(Config.DATABASE_READ_URL)
+    if Config.DATABASE_READ_URL
+    else engine
+)
 
 # Create session factory
 AsyncSessionLocal = sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False
 )
 
+ReadSessionLocal = sessionmaker(
+    bind=read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+# Celery tasks run every coroutine on a fresh event loop, so they must not
+# reuse pooled connections that belong to another loop
+worker_engine = create_async_engine(url=Config.DATABASE_URL, poolclass=NullPool)
+
+WorkerSessionLocal = sessionmaker(
+    bind=worker_engine, class_=AsyncSession, expire_on_commit=False
+)
+
 
 async def create_db_and_tables():
     async with engine.begin() as conn:
@@ -21,3 +58,9 @@ async def create_db_and_tables():
 async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def get_read_session() -> AsyncSession:
+    # The replica may lag behind, never read something here to write it back
+    async with ReadSessionLocal() as session:
+        yield session
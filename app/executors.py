@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor
+from functools import partial
+from typing import Callable
+
+
+def _timed(func, *args, **kwargs):
+    # Module level, so process pools can pickle it along with the call
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+class BoundedExecutor:
+    """Pool for blocking calls from the event loop, with a bounded queue.
+
+    At most `max_workers` calls run at once and `max_queue` more wait for a
+    worker, further calls raise `queue_full`. The pool is made by
+    `make_pool` on first use, so forked web workers never inherit one.
+    """
+
+    def __init__(
+        self,
+        make_pool: Callable[[int], Executor],
+        name: str,
+        queue_full: type[Exception],
+        max_workers: int,
+        max_queue: int,
+    ) -> None:
+        self.make_pool = make_pool
+        self.name = name
+        self.queue_full = queue_full
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool: Executor | None = None
+        self._outstanding = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            self._pool = self.make_pool(self.max_workers)
+        return self._pool
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._outstanding - self.max_workers)
+
+    async def call(self, func, *args, **kwargs):
+        with self._lock:
+            if self.queue_depth >= self.max_queue:
+                self._rejected += 1
+                raise self.queue_full(
+                    f"{self.name} queue is full ({self.queue_depth} pending calls)"
+                )
+            self._outstanding += 1
+
+        loop = asyncio.get_running_loop()
+        elapsed = None
+        try:
+            result, elapsed = await loop.run_in_executor(
+                self.pool, partial(_timed, func, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                self._completed += 1
+                if elapsed is not None:
+                    self._total_seconds += elapsed
+                    self._max_seconds = max(self._max_seconds, elapsed)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": min(self._outstanding, self.max_workers),
+                "queue_depth": self.queue_depth,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "mean_ms": self._total_seconds / max(self._completed, 1) * 1000,
+                "max_ms": self._max_seconds * 1000,
+            }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,365 @@
+import os
+import smtplib
+import socket
+import ssl
+import time
+import uuid
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+
+import orjson
+from loguru import logger
+from redis import Redis
+from redis.exceptions import ResponseError
+
+from app.db.redis import redis_client
+from app.mail import mail_config
+
+OUTBOX_STREAM = "mail:outbox"
+DEAD_LETTER_STREAM = "mail:dead"
+RETRY_KEY = "mail:retry"
+STATS_KEY = "mail:stats"
+SENDERS_GROUP = "mail_senders"
+# Messages sent per minute, kept for an hour
+SENT_PER_MINUTE_TTL = 3600
+
+# Moves due retries back to the outbox, atomic so two workers never both do it
+PROMOTE_RETRIES = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, message in ipairs(due) do
+    redis.call('ZREM', KEYS[1], message)
+    redis.call('XADD', KEYS[2], '*', 'data', message)
+end
+return #due
+"""
+
+
+def sent_per_minute_key(minute: int) -> str:
+    return f"mail:sent:{minute}"
+
+
+def encode_message(recipients: list[str], subject: str, body: str) -> bytes:
+    # The id keeps identical messages apart in the retry set
+    return orjson.dumps(
+        {
+            "id": uuid.uuid4().hex,
+            "recipients": recipients,
+            "subject": subject,
+            "body": body,
+            "attempts": 0,
+        }
+    )
+
+
+def build_email(message: dict) -> EmailMessage:
+    email = EmailMessage()
+    email["From"] = formataddr((mail_config.MAIL_FROM_NAME, mail_config.MAIL_FROM))
+    email["To"] = ", ".join(message["recipients"])
+    email["Subject"] = message["subject"]
+    email["Message-ID"] = make_msgid()
+    email.set_content(message["body"], subtype="html")
+    return email
+
+
+class SmtpUnavailable(Exception):
+    """Raised when no SMTP session can be opened, nothing was sent."""
+
+
+def is_permanent(error: Exception) -> bool:
+    # 5xx replies and refused recipients will not succeed on a retry
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class SmtpConnection:
+    """One SMTP session reused for every message a worker process sends.
+
+    It is opened on the first message, checked with NOOP after sitting idle
+    and reopened after `max_messages`, since most servers cap the number of
+    messages per session.
+    """
+
+    def __init__(self, timeout: int, idle_timeout: int, max_messages: int) -> None:
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self._smtp: smtplib.SMTP | None = None
+        self._sent = 0
+        self._last_used = 0.0
+        self._pid = None
+
+    def _connect(self) -> smtplib.SMTP:
+        context = ssl.create_default_context()
+        if not mail_config.VALIDATE_CERTS:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        if mail_config.MAIL_SSL_TLS:
+            smtp = smtplib.SMTP_SSL(
+                mail_config.MAIL_SERVER,
+                mail_config.MAIL_PORT,
+                timeout=self.timeout,
+                context=context,
+            )
+        else:
+            smtp = smtplib.SMTP(
+                mail_config.MAIL_SERVER, mail_config.MAIL_PORT, timeout=self.timeout
+            )
+            if mail_config.MAIL_STARTTLS:
+                smtp.starttls(context=context)
+        if mail_config.USE_CREDENTIALS:
+            smtp.login(
+                mail_config.MAIL_USERNAME, mail_config.MAIL_PASSWORD.get_secret_value()
+            )
+        self._sent = 0
+        self._pid = os.getpid()
+        return smtp
+
+    def _alive(self) -> bool:
+        if time.monotonic() - self._last_used < self.idle_timeout:
+            return True
+        try:
+            return self._smtp.noop()[0] == 250
+        except OSError:
+            # smtplib errors are OSErrors as well
+            return False
+
+    def session(self) -> tuple[smtplib.SMTP, bool]:
+        """Return the SMTP session and whether it was just opened."""
+        # A session inherited through fork belongs to the parent process
+        if self._smtp is not None and (
+            self._pid != os.getpid() or self._sent >= self.max_messages
+        ):
+            self.close()
+        if self._smtp is not None and not self._alive():
+            self.close()
+        if self._smtp is None:
+            try:
+                self._smtp = self._connect()
+            except OSError as e:
+                raise SmtpUnavailable(f"{mail_config.MAIL_SERVER}: {e}") from e
+            return self._smtp, True
+        return self._smtp, False
+
+    def send(self, email: EmailMessage) -> bool:
+        """Send over the open session, reconnecting once if it was dropped.
+
+        Returns whether a new connection was opened.
+        """
+        smtp, connected = self.session()
+        try:
+            smtp.send_message(email)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.close()
+            smtp, connected = self.session()
+            smtp.send_message(email)
+            connected = True
+        self._sent += 1
+        self._last_used = time.monotonic()
+        return connected
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            if self._pid == os.getpid():
+                self._smtp.quit()
+        except OSError:
+            pass
+        self._smtp = None
+
+
+class MailDelivery:
+    """Sends queued mail in batches from a Redis stream.
+
+    `send_email` tasks only append to OUTBOX_STREAM, then drain it. Every
+    worker process reads with its own consumer in one group and sends over
+    its persistent SMTP session, so a burst of tasks turns into a few long
+    batches instead of one handshake per message. Transient failures are
+    parked in RETRY_KEY with an exponential backoff and moved back to the
+    stream when due. Permanent failures and messages out of attempts go to
+    DEAD_LETTER_STREAM. Counters for all of this are kept in STATS_KEY.
+    """
+
+    def __init__(
+        self,
+        client: Redis,
+        connection: SmtpConnection,
+        batch_size: int,
+        max_attempts: int,
+        retry_backoff: int,
+        retry_backoff_max: int,
+        claim_idle_ms: int,
+    ) -> None:
+        self.client = client
+        self.connection = connection
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.claim_idle_ms = claim_idle_ms
+        self._promote_retries = client.register_script(PROMOTE_RETRIES)
+        self._group_ready = False
+
+    @property
+    def consumer(self) -> str:
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            self.client.xgroup_create(
+                OUTBOX_STREAM, SENDERS_GROUP, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def enqueue(self, recipients: list[str], subject: str, body: str) -> None:
+        self.client.xadd(
+            OUTBOX_STREAM, {"data": encode_message(recipients, subject, body)}
+        )
+
+    def backoff(self, attempts: int) -> int:
+        return min(self.retry_backoff * 2 ** (attempts - 1), self.retry_backoff_max)
+
+    def promote_retries(self) -> int:
+        return self._promote_retries(
+            keys=[RETRY_KEY, OUTBOX_STREAM], args=[time.time(), self.batch_size]
+        )
+
+    def _read(self) -> list:
+        # Entries of workers that died mid-batch come first
+        claimed = self.client.xautoclaim(
+            OUTBOX_STREAM,
+            SENDERS_GROUP,
+            self.consumer,
+            min_idle_time=self.claim_idle_ms,
+            count=self.batch_size,
+        )[1]
+        if claimed:
+            return claimed
+        response = self.client.xreadgroup(
+            SENDERS_GROUP, self.consumer, {OUTBOX_STREAM: ">"}, count=self.batch_size
+        )
+        return response[0][1] if response else []
+
+    def drain(self) -> int | None:
+        """Send queued mail until the outbox is empty.
+
+        Returns the delay in seconds of the earliest retry scheduled, if any.
+        """
+        self._ensure_group()
+        self.promote_retries()
+        next_retry = None
+        while True:
+            entries = self._read()
+            if not entries:
+                return next_retry
+            retry_in = self._send_batch(entries)
+            if retry_in is not None:
+                next_retry = min(next_retry or retry_in, retry_in)
+
+    def _send_batch(self, entries: list) -> int | None:
+        counts = {"sent": 0, "retried": 0, "dead": 0, "connections": 0}
+        retries = {}
+        dead = []
+        unreachable = None
+        start_time = time.perf_counter()
+
+        for _, fields in entries:
+            if not fields:
+                # Deleted while pending
+                continue
+            message = orjson.loads(fields[b"data"])
+            error = unreachable
+            if error is None:
+                try:
+                    if self.connection.send(build_email(message)):
+                        counts["connections"] += 1
+                    counts["sent"] += 1
+                    continue
+                except SmtpUnavailable as e:
+                    # Do not try every remaining message against a dead server
+                    error = unreachable = e
+                except OSError as e:
+                    error = e
+                    if not isinstance(
+                        e,
+                        (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused),
+                    ):
+                        # The session is in an unknown state after a dropped reply
+                        self.connection.close()
+
+            message["attempts"] += 1
+            message["last_error"] = str(error)
+            if is_permanent(error) or message["attempts"] >= self.max_attempts:
+                logger.error("Dropping mail to {}: {}", message["recipients"], error)
+                dead.append(orjson.dumps(message))
+            else:
+                retries[orjson.dumps(message)] = time.time() + self.backoff(
+                    message["attempts"]
+                )
+
+        elapsed = time.perf_counter() - start_time
+        counts["retried"] = len(retries)
+        counts["dead"] = len(dead)
+        ids = [entry_id for entry_id, _ in entries]
+        minute = int(time.time() // 60)
+        with self.client.pipeline(transaction=True) as pipe:
+            if retries:
+                pipe.zadd(RETRY_KEY, retries)
+            for message in dead:
+                pipe.xadd(DEAD_LETTER_STREAM, {"data": message})
+            for name, count in counts.items():
+                if count:
+                    pipe.hincrby(STATS_KEY, name, count)
+            pipe.hincrbyfloat(STATS_KEY, "send_seconds", elapsed)
+            pipe.incrby(sent_per_minute_key(minute), counts["sent"])
+            pipe.expire(sent_per_minute_key(minute), SENT_PER_MINUTE_TTL)
+            pipe.xack(OUTBOX_STREAM, SENDERS_GROUP, *ids)
+            pipe.xdel(OUTBOX_STREAM, *ids)
+            pipe.execute()
+
+        if counts["sent"]:
+            logger.info(
+                "Sent {} mails in {:.2f}s over {} new connections",
+                counts["sent"],
+                elapsed,
+                counts["connections"],
+            )
+        if not retries:
+            return None
+        return max(1, int(min(retries.values()) - time.time()))
+
+
+async def get_mail_stats(minutes: int = 5) -> dict:
+    """Delivery counters and queue sizes, read by the API with the async client."""
+    minute = int(time.time() // 60)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hgetall(STATS_KEY)
+        pipe.xlen(OUTBOX_STREAM)
+        pipe.zcard(RETRY_KEY)
+        pipe.xlen(DEAD_LETTER_STREAM)
+        # The current minute is still filling up
+        for i in range(1, minutes + 1):
+            pipe.get(sent_per_minute_key(minute - i))
+        counters, queued, retrying, dead, *sent = await pipe.execute()
+
+    counters = {k.decode(): float(v) for k, v in counters.items()}
+    sent_total = counters.get("sent", 0)
+    return {
+        "queued": queued,
+        "retrying": retrying,
+        "dead": dead,
+        "sent": int(sent_total),
+        "retried": int(counters.get("retried", 0)),
+        "dropped": int(counters.get("dead", 0)),
+        "connections": int(counters.get("connections", 0)),
+        "mean_send_ms": counters.get("send_seconds", 0) / max(sent_total, 1) * 1000,
+        "sent_per_minute": [int(count or 0) for count in sent],
+    }
@@ -1,9 +1,20 @@
+import asyncio
+
 from fastapi import FastAPI
 
 from app.auth.routes import auth_router
+from app.auth.events import listen_auth_events
+from app.auth.hashing import password_hasher
 from contextlib import asynccontextmanager
 from app.db.session import create_db_and_tables
-from app.object_detection.routes import yolo_router
+from app.config import Config
+from app.object_detection.routes import (
+    yolo_router,
+    inference_executor,
+    yolo_services,
+    yolo_output_writer,
+)
+from app.object_detection.registry import listen_model_events
 from app.auth.services import AdminService
 from app.db.session import AsyncSessionLocal
 from app.auth.schemas import AdminCreateModel
@@ -29,7 +40,27 @@ async def lifespan(app: FastAPI):
     async with AsyncSessionLocal() as session:
         admin_data = AdminCreateModel()
         await admin_services.create_admin(admin_data=admin_data, session=session)
+    auth_events = asyncio.create_task(listen_auth_events())
+    model_events = None
+    # Runs in each worker after the fork, never in a preloading Gunicorn master
+    if Config.INFERENCE_EXECUTOR == "thread":
+        if Config.MODEL_WARMUP and Config.MODEL_LOAD_MODE == "lazy":
+            yolo_services.start_warmup()
+        elif Config.MODEL_WARMUP:
+            # Not ready before the model is warm, requests never hit a cold model
+            await asyncio.to_thread(yolo_services.warmup)
+        model_events = asyncio.create_task(listen_model_events(yolo_services.registry))
+    if Config.WRITE_BEHIND_ENABLED:
+        await yolo_output_writer.start()
     yield
+    if Config.WRITE_BEHIND_ENABLED:
+        # Flush everything this worker has read before it exits
+        await yolo_output_writer.stop()
+    auth_events.cancel()
+    if model_events is not None:
+        model_events.cancel()
+    inference_executor.shutdown()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -1,14 +1,99 @@
 import logging
 import time
 
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import Config
 
 logger = logging.getLogger("uvicorn.access")
 logger.disabled = True
 
 
+class BodyTooLarge(HTTPException):
+    # An HTTPException so FastAPI's body parsing re-raises it unchanged
+    # instead of turning it into a generic 400
+    def __init__(self, max_body_size: int) -> None:
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={
+                "message": f"Request body exceeds {max_body_size} bytes",
+                "error_code": "upload_too_large",
+            },
+        )
+
+
+class UploadSizeLimitMiddleware:
+    """Reject request bodies larger than `max_body_size` while they stream in.
+
+    A declared Content-Length is checked before anything is read, chunked
+    uploads are counted chunk by chunk, so an oversized upload is never
+    buffered in full. `path_limits` maps path suffixes to their own limit.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_body_size: int,
+        path_limits: dict[str, int] | None = None,
+    ) -> None:
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_limits = path_limits or {}
+
+    def get_limit(self, path: str) -> int:
+        for suffix, limit in self.path_limits.items():
+            if path.endswith(suffix):
+                return limit
+        return self.max_body_size
+
+    def too_large_response(self, max_body_size: int) -> JSONResponse:
+        error = BodyTooLarge(max_body_size)
+        return JSONResponse(
+            content={"detail": error.detail}, status_code=error.status_code
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_body_size = self.get_limit(scope["path"])
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and int(content_length) > max_body_size:
+            await self.too_large_response(max_body_size)(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise BodyTooLarge(max_body_size)
+            return message
+
+        async def tracked_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except BodyTooLarge:
+            if response_started:
+                raise
+            await self.too_large_response(max_body_size)(scope, receive, send)
+
+
 def register_middleware(app: FastAPI):
 
     @app.middleware("http")
@@ -32,3 +117,9 @@ def register_middleware(app: FastAPI):
     app.add_middleware(
         TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1", "0.0.0.0"]
     )
+
+    app.add_middleware(
+        UploadSizeLimitMiddleware,
+        max_body_size=Config.MAX_UPLOAD_BYTES,
+        path_limits={"/obj/detection/batch": Config.MAX_BATCH_UPLOAD_BYTES},
+    )
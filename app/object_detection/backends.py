@@ -0,0 +1,206 @@
+"""Inference backends for the YOLO model.
+
+The PyTorch weights in MODEL_PATH can be exported once to ONNX Runtime or
+OpenVINO (optionally INT8 quantized) and cached on disk, ultralytics then
+runs the exported artifact through the same `predict` API. Test-time
+augmentation is only supported by the PyTorch backend and is ignored by the
+others.
+
+Export the configured backend ahead of time and compare it with PyTorch:
+
+    python -m app.object_detection.backends export
+    python -m app.object_detection.backends parity path/to/reference/images
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from filelock import FileLock
+
+from app.config import Config
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+BACKENDS = ("torch", "onnx", "openvino")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+def get_export_path(model_path: str, backend: str, int8: bool) -> Path:
+    # The artifact name carries a digest of the weights, so replaced weights
+    # are exported again instead of reusing a stale conversion
+    weights = Path(model_path).resolve()
+    stat = weights.stat()
+    digest = hashlib.blake2b(
+        f"{weights}:{stat.st_size}:{stat.st_mtime_ns}".encode(), digest_size=6
+    ).hexdigest()
+    export_dir = (
+        Path(Config.MODEL_EXPORT_DIR) if Config.MODEL_EXPORT_DIR else weights.parent
+    )
+    name = f"{weights.stem}-{digest}{'-int8' if int8 else ''}"
+    if backend == "onnx":
+        return export_dir / f"{name}.onnx"
+    return export_dir / f"{name}_openvino_model"
+
+
+def quantize_onnx(source: Path, target: Path) -> None:
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        raise RuntimeError("INT8 ONNX models need the onnxruntime package installed")
+    quantize_dynamic(str(source), str(target), weight_type=QuantType.QUInt8)
+
+
+def export_model(model_path: str, backend: str, int8: bool = False) -> str:
+    """Return the path of the model artifact for `backend`, exporting it once."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend == "torch":
+        return model_path
+
+    target = get_export_path(model_path, backend, int8)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Every web worker starts at the same time, only one of them converts
+    with FileLock(f"{target}.lock"):
+        if target.exists():
+            return str(target)
+
+        from ultralytics import YOLO
+
+        image_size = max(p.image_size for p in Config.INFERENCE_PROFILES.values())
+        exported = YOLO(model_path).export(
+            format=backend,
+            imgsz=image_size,
+            dynamic=True,
+            int8=int8 and backend == "openvino",
+            data=Config.INFERENCE_INT8_DATA,
+        )
+        if backend == "onnx" and int8:
+            quantize_onnx(Path(exported), target)
+            os.remove(exported)
+        else:
+            shutil.move(exported, target)
+    return str(target)
+
+
+def load_model(model_path: str, backend: str, int8: bool = False) -> "YOLO":
+    # ultralytics pulls in torch, import it only when a model is needed
+    from ultralytics import YOLO
+
+    model_file = export_model(model_path, backend, int8)
+    if backend == "torch":
+        return YOLO(model_file)
+    return YOLO(model_file, task="detect")
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def compare_boxes(reference: np.ndarray, candidate: np.ndarray) -> tuple[int, float]:
+    """Greedily match boxes at IoU >= 0.5, return (matches, mean matched IoU)."""
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0, 0.0
+    iou = box_iou(reference, candidate)
+    matched = []
+    while True:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[i, j] < 0.5:
+            break
+        matched.append(iou[i, j])
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return len(matched), float(np.mean(matched)) if matched else 0.0
+
+
+def check_parity(
+    image_dir: str,
+    backend: str = Config.INFERENCE_BACKEND,
+    int8: bool = Config.INFERENCE_INT8,
+    profile: str | None = None,
+    max_count_error: float = 0.05,
+) -> dict:
+    """Compare detections of `backend` against PyTorch on reference images.
+
+    Passes when the total object count differs by at most `max_count_error`
+    and at least 1 - `max_count_error` of the reference boxes are matched.
+    """
+    params = Config.INFERENCE_PROFILES[profile or Config.INFERENCE_DEFAULT_PROFILE]
+    predict_kwargs = dict(
+        imgsz=params.image_size, conf=params.conf, max_det=params.max_det
+    )
+    reference_model = load_model(Config.MODEL_PATH, "torch")
+    candidate_model = load_model(Config.MODEL_PATH, backend, int8)
+
+    images = sorted(
+        p for p in Path(image_dir).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES
+    )
+    report = {"backend": backend, "int8": int8, "images": []}
+    reference_total = candidate_total = matched_total = 0
+    for image in images:
+        reference = reference_model.predict(
+            str(image), verbose=False, **predict_kwargs
+        )[0]
+        candidate = candidate_model.predict(
+            str(image), verbose=False, **predict_kwargs
+        )[0]
+        reference_boxes = reference.boxes.xyxy.cpu().numpy()
+        candidate_boxes = candidate.boxes.xyxy.cpu().numpy()
+        matches, mean_iou = compare_boxes(reference_boxes, candidate_boxes)
+
+        reference_total += len(reference_boxes)
+        candidate_total += len(candidate_boxes)
+        matched_total += matches
+        report["images"].append(
+            {
+                "image": image.name,
+                "reference_count": len(reference_boxes),
+                "candidate_count": len(candidate_boxes),
+                "matched": matches,
+                "mean_iou": mean_iou,
+            }
+        )
+
+    count_error = abs(candidate_total - reference_total) / max(reference_total, 1)
+    recall = matched_total / max(reference_total, 1)
+    report.update(
+        reference_count=reference_total,
+        candidate_count=candidate_total,
+        count_error=count_error,
+        matched_ratio=recall,
+        passed=count_error <= max_count_error and recall >= 1 - max_count_error,
+    )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="export and cache the configured backend")
+    parity = commands.add_parser("parity", help="compare the backend with PyTorch")
+    parity.add_argument("image_dir")
+    parity.add_argument("--profile", default=None)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(
+            export_model(
+                Config.MODEL_PATH, Config.INFERENCE_BACKEND, Config.INFERENCE_INT8
+            )
+        )
+    else:
+        result = check_parity(args.image_dir, profile=args.profile)
+        for row in result.pop("images"):
+            print(row)
+        print(result)
+        raise SystemExit(0 if result["passed"] else 1)
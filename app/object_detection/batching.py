@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+
+class BatchInferenceScheduler:
+    """Collect concurrent predict calls and run them as one batched predict.
+
+    Callers submit a single image and get back a Future. A background thread
+    gathers up to `max_batch_size` images or waits at most `max_wait_ms`,
+    groups them by their predict arguments and calls `predict_batch` once per
+    group, so only one forward pass runs at a time.
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[list, dict], list],
+        max_batch_size: int = 8,
+        max_wait_ms: int = 10,
+    ) -> None:
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def submit(self, image: Any, **predict_kwargs) -> Future:
+        future = Future()
+        key = tuple(sorted(predict_kwargs.items()))
+        self._ensure_worker()
+        self._queue.put((key, image, future))
+        return future
+
+    def _worker_running(self) -> bool:
+        return (
+            self._worker is not None
+            and self._worker.is_alive()
+            and self._pid == os.getpid()
+        )
+
+    def _ensure_worker(self) -> None:
+        # The thread is started lazily so that a forked worker process gets
+        # its own scheduler thread instead of a dead copy from the parent.
+        if self._worker_running():
+            return
+        with self._lock:
+            if self._worker_running():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(
+                target=self._run, name="yolo-batch-scheduler", daemon=True
+            )
+            self._worker.start()
+
+    def _collect_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect_batch()
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: list) -> None:
+        groups: dict[tuple, list] = {}
+        for key, image, future in batch:
+            if future.set_running_or_notify_cancel():
+                groups.setdefault(key, []).append((image, future))
+
+        for key, items in groups.items():
+            try:
+                results = self.predict_batch([image for image, _ in items], dict(key))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
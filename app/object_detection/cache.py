@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import BinaryIO
+
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.db.redis import redis_client
+
+
+def hash_upload(binary_image: bytes | BinaryIO) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(binary_image, (bytes, bytearray, memoryview)):
+        digest.update(binary_image)
+        return digest.hexdigest()
+
+    # Spooled uploads are hashed chunk by chunk and rewound for the decoder
+    binary_image.seek(0)
+    while chunk := binary_image.read(1024 * 1024):
+        digest.update(chunk)
+    binary_image.seek(0)
+    return digest.hexdigest()
+
+
+class DetectionCacheEntry:
+    __slots__ = ("table", "image")
+
+    def __init__(self, table: bytes, image: bytes | None = None) -> None:
+        self.table = table
+        self.image = image
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.table) + (len(self.image) if self.image is not None else 0)
+
+
+class DetectionCache:
+    """Two-tier cache of detection results keyed by the uploaded image hash.
+
+    The first tier is an in-process LRU bounded by `max_bytes`, the second is
+    Redis shared by every worker. Keys include the model fingerprint and the
+    inference parameters, so a new `MODEL_PATH` never hits older entries.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: int,
+        store_images: bool = True,
+        enabled: bool = True,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.store_images = store_images
+        self.enabled = enabled
+        self._entries: OrderedDict[str, DetectionCacheEntry] = OrderedDict()
+        self._nbytes = 0
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def make_key(self, binary_image: bytes | BinaryIO, namespace: str) -> str:
+        # Hashing a multi-megabyte upload releases the GIL, keep it off the loop
+        digest = await asyncio.to_thread(hash_upload, binary_image)
+        return f"detection_cache:{namespace}:{digest}"
+
+    def _remember(self, key: str, entry: DetectionCacheEntry) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._nbytes -= old.nbytes
+        self._entries[key] = entry
+        self._nbytes += entry.nbytes
+        while self._nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    async def get(self, key: str) -> DetectionCacheEntry | None:
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return entry
+
+        try:
+            table, image = await redis_client.mget(f"{key}:table", f"{key}:image")
+        except RedisError as e:
+            logger.warning("Detection cache lookup failed: {}", e)
+            table, image = None, None
+
+        if table is None:
+            self.misses += 1
+            return None
+
+        entry = DetectionCacheEntry(table, image)
+        self._remember(key, entry)
+        self.redis_hits += 1
+        return entry
+
+    async def set(self, key: str, table: bytes, image: bytes | None = None) -> None:
+        if not self.enabled:
+            return
+        if not self.store_images:
+            image = None
+
+        entry = DetectionCacheEntry(table, image)
+        self._remember(key, entry)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(f"{key}:table", table, ex=self.ttl)
+                if image is not None:
+                    pipe.set(f"{key}:image", image, ex=self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("Detection cache store failed: {}", e)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._nbytes,
+            "max_bytes": self.max_bytes,
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (
+                (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0
+            ),
+        }
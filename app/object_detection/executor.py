@@ -0,0 +1,85 @@
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from app.executors import BoundedExecutor
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference executor already has too many pending calls."""
+
+
+# Per-process services instance used when the executor runs in process mode
+_worker_services = None
+
+
+def _init_worker_services() -> None:
+    global _worker_services
+    from app.object_detection.services import YoloServices
+
+    _worker_services = YoloServices()
+
+
+def _to_picklable(arg):
+    # File objects can not be sent to another process, send their content
+    if hasattr(arg, "read") and hasattr(arg, "seek"):
+        arg.seek(0)
+        return arg.read()
+    if isinstance(arg, (list, tuple)):
+        # e.g. the spooled uploads passed to detect_many
+        return type(arg)(_to_picklable(item) for item in arg)
+    return arg
+
+
+def _call_worker_services(method_name: str, *args, **kwargs):
+    return getattr(_worker_services, method_name)(*args, **kwargs)
+
+
+class InferenceExecutor(BoundedExecutor):
+    """Bounded pool that runs CPU-heavy `YoloServices` methods off the event loop.
+
+    In "thread" mode the calls run on the given services instance, in
+    "process" mode every worker process loads its own `YoloServices`, so
+    arguments and results must be picklable.
+    """
+
+    def __init__(
+        self,
+        services,
+        mode: str = "thread",
+        max_workers: int = 4,
+        max_queue: int = 32,
+    ) -> None:
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor mode: {mode}")
+        super().__init__(
+            make_pool=self._make_pool,
+            name="Inference",
+            queue_full=InferenceQueueFull,
+            max_workers=max_workers,
+            max_queue=max_queue,
+        )
+        self.services = services
+        self.mode = mode
+
+    def _make_pool(self, max_workers: int) -> Executor:
+        if self.mode == "process":
+            return ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker_services,
+            )
+        return ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="yolo-inference"
+        )
+
+    async def run(self, method_name: str, *args, **kwargs):
+        if self.mode == "process":
+            args = [_to_picklable(arg) for arg in args]
+            call = partial(_call_worker_services, method_name, *args, **kwargs)
+        else:
+            call = partial(getattr(self.services, method_name), *args, **kwargs)
+        return await self.call(call)
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, **super().stats()}
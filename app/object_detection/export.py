@@ -0,0 +1,132 @@
+"""Incremental encoders for the detection history export.
+
+Rows arrive in chunks from a server-side cursor and every chunk is encoded
+on its own, so an export never holds more than one chunk in memory. Parquet
+needs the optional pyarrow package, each chunk becomes one row group.
+"""
+
+import csv
+import io
+
+import orjson
+
+EXPORT_COLUMNS = (
+    "uid",
+    "username",
+    "email",
+    "sample_name",
+    "total_objects",
+    "created_at",
+)
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportFormatUnavailable(ValueError):
+    """Raised when the export format needs a package that is not installed."""
+
+
+class CsvEncoder:
+    def header(self) -> bytes:
+        return self.encode([EXPORT_COLUMNS])
+
+    def encode(self, rows: list) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: list) -> bytes:
+        return b"".join(
+            orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows
+        )
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _ChunkSink(io.RawIOBase):
+    # A write-only file that hands out what was written since the last call,
+    # tell() keeps counting so the Parquet footer gets the right offsets
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ParquetEncoder:
+    def __init__(self) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportFormatUnavailable(
+                "Parquet export needs the pyarrow package installed"
+            )
+        self.pa = pa
+        self.schema = pa.schema(
+            [
+                ("uid", pa.string()),
+                ("username", pa.string()),
+                ("email", pa.string()),
+                ("sample_name", pa.string()),
+                ("total_objects", pa.int64()),
+                ("created_at", pa.timestamp("s")),
+            ]
+        )
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema)
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: list) -> bytes:
+        columns = list(zip(*rows))
+        columns[0] = [str(uid) for uid in columns[0]]
+        self.writer.write_table(
+            self.pa.Table.from_arrays(
+                [self.pa.array(c, type=f.type) for c, f in zip(columns, self.schema)],
+                schema=self.schema,
+            )
+        )
+        return self.sink.take()
+
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.take()
+
+
+def get_encoder(export_format: str):
+    if export_format == "csv":
+        return CsvEncoder()
+    if export_format == "ndjson":
+        return NdjsonEncoder()
+    if export_format == "parquet":
+        return ParquetEncoder()
+    raise ValueError(f"Unknown export format: {export_format}")
@@ -0,0 +1,98 @@
+import uuid
+from datetime import datetime, timezone
+
+from redis import Redis
+
+from app.config import Config
+from app.db.redis import redis_client
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def job_key(job_id: str) -> str:
+    return f"detection_job:{job_id}"
+
+
+def job_image_key(job_id: str) -> str:
+    return f"detection_job:{job_id}:image"
+
+
+def job_result_key(job_id: str) -> str:
+    return f"detection_job:{job_id}:result"
+
+
+def _decode(data: dict) -> dict:
+    return {k.decode(): v.decode() for k, v in data.items()}
+
+
+class DetectionJobService:
+    """Stores detection jobs in Redis for the API and the inference workers."""
+
+    async def create_job(
+        self,
+        binary_image: bytes,
+        sample_name: str | None,
+        user_id: uuid.UUID,
+        profile: str,
+    ) -> str:
+        job_id = str(uuid.uuid4())
+        ttl = Config.DETECTION_JOB_TTL
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(job_image_key(job_id), binary_image, ex=ttl)
+            pipe.hset(
+                job_key(job_id),
+                mapping={
+                    "status": JOB_QUEUED,
+                    "user_id": str(user_id),
+                    "sample_name": sample_name or "",
+                    "profile": profile,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                },
+            )
+            pipe.expire(job_key(job_id), ttl)
+            await pipe.execute()
+        return job_id
+
+    async def get_job(self, job_id: str) -> dict | None:
+        data = await redis_client.hgetall(job_key(job_id))
+        if not data:
+            return None
+        return _decode(data)
+
+    async def get_job_image(self, job_id: str) -> bytes | None:
+        return await redis_client.get(job_result_key(job_id))
+
+    # The methods below are called from the Celery worker with a sync client
+
+    def load_job_image(self, client: Redis, job_id: str) -> bytes | None:
+        client.hset(job_key(job_id), "status", JOB_RUNNING)
+        return client.get(job_image_key(job_id))
+
+    def get_job_sync(self, client: Redis, job_id: str) -> dict | None:
+        data = client.hgetall(job_key(job_id))
+        if not data:
+            return None
+        return _decode(data)
+
+    def complete_job(
+        self, client: Redis, job_id: str, total_objects: int, image: bytes | None
+    ) -> None:
+        ttl = Config.DETECTION_JOB_TTL
+        with client.pipeline(transaction=True) as pipe:
+            if image is not None:
+                pipe.set(job_result_key(job_id), image, ex=ttl)
+            pipe.hset(
+                job_key(job_id),
+                mapping={"status": JOB_DONE, "total_objects": total_objects},
+            )
+            pipe.delete(job_image_key(job_id))
+            pipe.execute()
+
+    def fail_job(self, client: Redis, job_id: str, error: str) -> None:
+        with client.pipeline(transaction=True) as pipe:
+            pipe.hset(job_key(job_id), mapping={"status": JOB_FAILED, "error": error})
+            pipe.delete(job_image_key(job_id))
+            pipe.execute()
@@ -0,0 +1,46 @@
+import base64
+import uuid
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from app.db.models import YoloOutput
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor was not issued by this API."""
+
+
+def encode_cursor(created_at: datetime, uid: uuid.UUID) -> str:
+    value = f"{created_at.isoformat()}|{uid.hex}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, uid = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(hex=uid)
+    except ValueError:
+        raise InvalidCursor("Invalid pagination cursor")
+
+
+def after_cursor(cursor: str):
+    """Rows after the cursor in (created_at, uid) descending order.
+
+    Spelled out instead of a row comparison so MySQL can range scan the
+    (created_at, uid) indexes.
+    """
+    created_at, uid = decode_cursor(cursor)
+    return or_(
+        YoloOutput.created_at < created_at,
+        and_(YoloOutput.created_at == created_at, YoloOutput.uid < uid),
+    )
+
+
+def next_page(rows: list, limit: int) -> tuple[list, str | None]:
+    """Trim the extra row fetched past `limit` and return the next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].uid)
@@ -0,0 +1,60 @@
+import threading
+from collections import deque
+
+from app.config import Config
+
+
+class UnknownProfile(ValueError):
+    """Raised when a request names an inference profile that is not configured."""
+
+
+def resolve_profile(requested: str | None, role: str) -> str:
+    """Return the profile to run, downgraded to the cap of the caller's role."""
+    names = list(Config.INFERENCE_PROFILES)
+    profile = requested or Config.INFERENCE_DEFAULT_PROFILE
+    if profile not in Config.INFERENCE_PROFILES:
+        raise UnknownProfile(
+            f"Unknown inference profile {profile!r}, choose one of {', '.join(names)}"
+        )
+
+    max_profile = Config.INFERENCE_ROLE_MAX_PROFILE.get(role)
+    if max_profile in Config.INFERENCE_PROFILES and names.index(profile) > names.index(
+        max_profile
+    ):
+        return max_profile
+    return profile
+
+
+class ProfileLatencyStats:
+    """Inference latency per profile over the last `window` uncached requests."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self.window = window
+        self._samples: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, profile: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.setdefault(profile, deque(maxlen=self.window))
+            samples.append(seconds)
+            self._counts[profile] = self._counts.get(profile, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {
+                name: sorted(samples) for name, samples in self._samples.items()
+            }
+            counts = dict(self._counts)
+
+        result = {}
+        for name, samples in snapshot.items():
+            n = len(samples)
+            result[name] = {
+                "count": counts[name],
+                "mean_ms": sum(samples) / n * 1000,
+                "p50_ms": samples[int(0.5 * (n - 1))] * 1000,
+                "p95_ms": samples[int(0.95 * (n - 1))] * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+        return result
@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+import orjson
+from loguru import logger
+from redis import Redis
+from redis.exceptions import RedisError
+
+from app.config import Config
+from app.db.redis import redis_client
+from app.object_detection.backends import BACKENDS, load_model
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+MODEL_EVENTS_CHANNEL = "model_registry:events"
+MODEL_ACTIVE_KEY = "model_registry:active"
+
+
+class ModelSwapInProgress(Exception):
+    """Raised when a model is requested while another one is still loading."""
+
+
+class NoPreviousModel(Exception):
+    """Raised on rollback when no previous model is kept in memory."""
+
+
+class ModelPathNotAllowed(ValueError):
+    """Raised when a model outside of the models directory is requested."""
+
+
+def get_models_dir() -> Path:
+    return Path(Config.MODEL_DIR or os.path.dirname(Config.MODEL_PATH) or ".").resolve()
+
+
+def resolve_model_path(model_path: str) -> str:
+    """Return the absolute path of a model, which must be in the models directory.
+
+    Weights are unpickled by torch, so loading an arbitrary file is running
+    arbitrary code. Relative paths are taken relative to the models directory.
+    """
+    models_dir = get_models_dir()
+    path = (models_dir / model_path).resolve()
+    if not path.is_relative_to(models_dir):
+        raise ModelPathNotAllowed(f"{model_path} is not in the models directory")
+    return str(path)
+
+
+def get_model_fingerprint(model_path: str, backend: str, int8: bool) -> str:
+    # Changes whenever the weights file is replaced or another model is used
+    stat = os.stat(model_path)
+    fingerprint = f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    # exported and quantized backends give slightly different detections
+    fingerprint += f":{backend}:{int8}"
+    return hashlib.blake2b(fingerprint.encode(), digest_size=8).hexdigest()
+
+
+class ModelVersion:
+    """A model, the weights it was loaded from and their fingerprint."""
+
+    __slots__ = ("model_path", "backend", "int8", "fingerprint", "model", "loaded_at")
+
+    def __init__(self, model_path: str, backend: str, int8: bool = False) -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend}")
+        self.model_path = model_path
+        self.backend = backend
+        self.int8 = int8
+        self.fingerprint = get_model_fingerprint(model_path, backend, int8)
+        self.model: "YOLO | None" = None
+        self.loaded_at: datetime | None = None
+
+    def load(self) -> None:
+        self.model = load_model(self.model_path, self.backend, self.int8)
+        if self.backend == "torch":
+            # Otherwise Conv+BN are fused on the first predict, after the fork
+            # of a preloading master, and every worker allocates its own copy
+            self.model.fuse()
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def to_dict(self) -> dict:
+        return {
+            "model_path": self.model_path,
+            "backend": self.backend,
+            "int8": self.int8,
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """Holds the active model of this process and the ones it replaced.
+
+    New versions are loaded and warmed up in a background thread and then
+    swapped in by replacing a single reference. Requests already running
+    keep the model object they started with, so nothing in flight is
+    dropped. The last `keep_previous` versions stay loaded, rolling back
+    swaps the active model with the most recent of them.
+    """
+
+    def __init__(
+        self, warmup: Callable[[ModelVersion], None], keep_previous: int = 1
+    ) -> None:
+        self.warmup = warmup
+        self._active: ModelVersion | None = None
+        self._previous: deque[ModelVersion] = deque(maxlen=max(keep_previous, 1))
+        self._loading: ModelVersion | None = None
+        self._last_error: str | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> ModelVersion:
+        version = self._active
+        if version is None:
+            # The configured model is loaded on first use, see MODEL_LOAD_MODE
+            with self._lock:
+                if self._active is None:
+                    version = ModelVersion(
+                        Config.MODEL_PATH,
+                        Config.INFERENCE_BACKEND,
+                        Config.INFERENCE_INT8,
+                    )
+                    version.load()
+                    self._active = version
+                version = self._active
+        return version
+
+    def active_fingerprint(self) -> str:
+        # Does not load the configured model when it is still lazy
+        if self._active is not None:
+            return self._active.fingerprint
+        return get_model_fingerprint(
+            Config.MODEL_PATH, Config.INFERENCE_BACKEND, Config.INFERENCE_INT8
+        )
+
+    def stage(self, model_path: str, backend: str, int8: bool) -> ModelVersion:
+        """Start loading a version in the background, it is activated when warm."""
+        model_path = resolve_model_path(model_path)
+        with self._lock:
+            if self._loading is not None:
+                raise ModelSwapInProgress(
+                    f"{self._loading.model_path} is still being loaded"
+                )
+            version = ModelVersion(model_path, backend, int8)
+            self._loading = version
+
+        thread = threading.Thread(
+            target=self._load_and_activate, args=(version,), name="model-load"
+        )
+        thread.daemon = True
+        thread.start()
+        return version
+
+    def _load_and_activate(self, version: ModelVersion) -> None:
+        try:
+            version.load()
+            self.warmup(version)
+        except Exception as e:
+            logger.exception("Loading model {} failed", version.model_path)
+            self._last_error = f"{version.model_path}: {e}"
+        else:
+            self.activate(version)
+            self._last_error = None
+            logger.info("Model {} is active", version.model_path)
+            record_active_model(version)
+        finally:
+            self._loading = None
+
+    def activate(self, version: ModelVersion) -> None:
+        with self._lock:
+            if self._active is not None:
+                self._previous.append(self._active)
+            self._active = version
+
+    def rollback(self) -> ModelVersion:
+        """Swap the active model with the previous one, calling it twice undoes it."""
+        with self._lock:
+            if not self._previous:
+                raise NoPreviousModel("No previous model is loaded")
+            version = self._previous.pop()
+            if self._active is not None:
+                self._previous.append(self._active)
+            self._active = version
+        return version
+
+    def state(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "active": self._active.to_dict() if self._active else None,
+            "previous": [version.to_dict() for version in reversed(self._previous)],
+            "loading": self._loading.to_dict() if self._loading else None,
+            "last_error": self._last_error,
+        }
+
+
+# Each web worker has its own registry, the events below keep them in step
+
+# Used from the model-load thread, which has no event loop for redis_client
+_sync_redis: Redis | None = None
+
+
+def record_active_model(version: ModelVersion) -> None:
+    """Remember a model once it is swapped in, workers started later load it."""
+    global _sync_redis
+    if _sync_redis is None:
+        _sync_redis = Redis.from_url(Config.REDIS_URL)
+    active = {k: getattr(version, k) for k in ("model_path", "backend", "int8")}
+    try:
+        _sync_redis.set(MODEL_ACTIVE_KEY, orjson.dumps(active))
+    except RedisError as e:
+        logger.warning("Active model not recorded: {}", e)
+
+
+async def publish_model_event(event: dict) -> None:
+    """Send a load or rollback to every worker."""
+    await redis_client.publish(MODEL_EVENTS_CHANNEL, orjson.dumps(event))
+
+
+async def apply_model_event(registry: ModelRegistry, event: dict) -> None:
+    try:
+        if event["action"] == "load":
+            registry.stage(event["model_path"], event["backend"], event["int8"])
+        elif event["action"] == "rollback":
+            version = registry.rollback()
+            # record_active_model blocks on the sync client
+            await asyncio.to_thread(record_active_model, version)
+        else:
+            logger.warning("Unknown model event {}", event)
+    except (KeyError, TypeError) as e:
+        logger.warning("Malformed model event {}: {}", event, e)
+    except (ModelSwapInProgress, NoPreviousModel, OSError, ValueError) as e:
+        logger.warning("Model event {} not applied: {}", event, e)
+
+
+async def sync_active_model(registry: ModelRegistry) -> None:
+    # A model loaded while this worker was down is picked up on start
+    data = await redis_client.get(MODEL_ACTIVE_KEY)
+    if data is None:
+        return
+    try:
+        active = orjson.loads(data)
+        fingerprint = get_model_fingerprint(
+            active["model_path"], active["backend"], active["int8"]
+        )
+    except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+        logger.warning("Malformed active model {!r}: {}", data, e)
+        return
+    except OSError as e:
+        logger.warning("Active model {} is not available: {}", active, e)
+        return
+    if fingerprint != registry.active_fingerprint():
+        await apply_model_event(registry, {"action": "load", **active})
+
+
+async def listen_model_events(registry: ModelRegistry) -> None:
+    """Apply model loads and rollbacks published by any web worker."""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(MODEL_EVENTS_CHANNEL)
+            await sync_active_model(registry)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                # A bad message is skipped, the worker keeps following swaps
+                try:
+                    event = orjson.loads(message["data"])
+                except orjson.JSONDecodeError as e:
+                    logger.warning("Malformed model event {!r}: {}", message["data"], e)
+                    continue
+                await apply_model_event(registry, event)
+        except (RedisError, OSError) as e:
+            logger.warning("Model events subscription failed: {}", e)
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.aclose()
@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+
+from app.object_detection.results import DetectionResult
+
+LABEL_MODES = ("none", "class", "confidence")
+
+
+def class_color(class_id: int) -> tuple:
+    # ultralytics imports torch, which is loaded anyway once there are boxes
+    from ultralytics.utils.plotting import colors
+
+    return colors(class_id, True)
+
+
+class BoxRenderer:
+    """Draw detection boxes with one OpenCV call per class.
+
+    Produces the same picture as `Annotator.box_label` in OpenCV mode: the
+    same automatic line width, anti-aliased lines and per-class colors, but
+    the box corners are computed for all detections at once and the
+    "Total Objects" overlay is drawn a single time.
+
+    `label_mode` is "none" (boxes only), "class" or "confidence" (class name
+    with the confidence in percent). `line_width` overrides the automatic
+    width derived from the image size.
+    """
+
+    def __init__(self, label_mode: str = "none", line_width: int | None = None):
+        if label_mode not in LABEL_MODES:
+            raise ValueError(f"Unknown bbox label mode: {label_mode}")
+        self.label_mode = label_mode
+        self.line_width = line_width
+
+    def get_line_width(self, image: np.ndarray) -> int:
+        return self.line_width or max(round(sum(image.shape) / 2 * 0.003), 2)
+
+    def render(self, image: np.ndarray, predict: DetectionResult) -> np.ndarray:
+        # `image` is an RGB array owned by the caller, boxes are drawn in place
+        lw = self.get_line_width(image)
+        tf = max(lw - 1, 1)
+        sf = lw / 3
+
+        if len(predict):
+            # Corners of every box in drawing order, truncated like int(x)
+            xyxy = predict.boxes.astype(np.int32)
+            corners = np.empty((len(predict), 4, 2), dtype=np.int32)
+            corners[:, 0] = xyxy[:, [0, 1]]
+            corners[:, 1] = xyxy[:, [2, 1]]
+            corners[:, 2] = xyxy[:, [2, 3]]
+            corners[:, 3] = xyxy[:, [0, 3]]
+
+            for class_id in np.unique(predict.cls).tolist():
+                cv2.polylines(
+                    image,
+                    list(corners[predict.cls == class_id]),
+                    isClosed=True,
+                    color=class_color(class_id),
+                    thickness=lw,
+                    lineType=cv2.LINE_AA,
+                )
+
+            if self.label_mode != "none":
+                self.draw_labels(image, predict, xyxy, sf, tf)
+
+        cv2.putText(
+            image,
+            f"Total Objects: {len(predict)}",
+            (30, 100),
+            0,
+            sf,
+            (255, 255, 255),
+            thickness=tf,
+            lineType=cv2.LINE_AA,
+        )
+        return image
+
+    def draw_labels(
+        self,
+        image: np.ndarray,
+        predict: DetectionResult,
+        xyxy: np.ndarray,
+        sf: float,
+        tf: int,
+    ) -> None:
+        names = predict.class_names()
+        confidences = predict.conf.tolist()
+        for (x1, y1, _, _), class_id, name, confidence in zip(
+            xyxy.tolist(), predict.cls.tolist(), names, confidences
+        ):
+            label = name
+            if self.label_mode == "confidence":
+                label = f"{name} {int(confidence * 100)}%"
+
+            color = class_color(class_id)
+            w, h = cv2.getTextSize(label, 0, fontScale=sf, thickness=tf)[0]
+            outside = y1 >= h + 3
+            y2 = y1 - h - 3 if outside else y1 + h + 3
+            cv2.rectangle(image, (x1, y1), (x1 + w, y2), color, -1, cv2.LINE_AA)
+            cv2.putText(
+                image,
+                label,
+                (x1, y1 - 2 if outside else y1 + h + 2),
+                0,
+                sf,
+                (255, 255, 255),
+                thickness=tf,
+                lineType=cv2.LINE_AA,
+            )
@@ -0,0 +1,132 @@
+import numpy as np
+import orjson
+
+# Packed layout used by to_bytes(): int32 count, float32 boxes, float32 conf,
+# int16 class ids, then the JSON names of the classes present
+_COUNT_DTYPE = np.dtype("<i4")
+_BOX_DTYPE = np.dtype("<f4")
+_CONF_DTYPE = np.dtype("<f4")
+_CLASS_DTYPE = np.dtype("<i2")
+
+
+class DetectionResult:
+    """Detections of one image as flat NumPy arrays.
+
+    `boxes` is an (N, 4) float32 array of xmin, ymin, xmax, ymax, `conf` an
+    (N,) float32 array and `cls` an (N,) int16 array of class ids. `names`
+    maps class ids to class names, as in `model.names`.
+    """
+
+    __slots__ = ("boxes", "conf", "cls", "names")
+
+    def __init__(
+        self, boxes: np.ndarray, conf: np.ndarray, cls: np.ndarray, names: dict
+    ) -> None:
+        self.boxes = boxes
+        self.conf = conf
+        self.cls = cls
+        self.names = names
+
+    @classmethod
+    def from_yolo(cls, result, names: dict) -> "DetectionResult":
+        # One device-to-host copy of the (N, 6) xyxy/conf/cls tensor
+        data = result.boxes.data.cpu().numpy()
+        return cls(
+            boxes=np.ascontiguousarray(data[:, :4], dtype=_BOX_DTYPE),
+            conf=np.ascontiguousarray(data[:, 4], dtype=_CONF_DTYPE),
+            cls=data[:, 5].astype(_CLASS_DTYPE),
+            names=names,
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes, names: dict | None = None) -> "DetectionResult":
+        count = int(np.frombuffer(data, dtype=_COUNT_DTYPE, count=1)[0])
+        offset = _COUNT_DTYPE.itemsize
+        boxes = np.frombuffer(data, dtype=_BOX_DTYPE, count=count * 4, offset=offset)
+        offset += boxes.nbytes
+        conf = np.frombuffer(data, dtype=_CONF_DTYPE, count=count, offset=offset)
+        offset += conf.nbytes
+        class_ids = np.frombuffer(data, dtype=_CLASS_DTYPE, count=count, offset=offset)
+        offset += class_ids.nbytes
+        if names is None:
+            # The names travel with the boxes, a later model may number classes
+            # differently. Older data without them falls back to the class ids.
+            stored = orjson.loads(data[offset:]) if len(data) > offset else {}
+            names = {int(class_id): name for class_id, name in stored.items()}
+        return cls(boxes.reshape(count, 4), conf, class_ids, names)
+
+    def to_bytes(self) -> bytes:
+        class_ids = np.unique(self.cls).tolist()
+        names = {str(c): self.names.get(c, str(c)) for c in class_ids}
+        return b"".join(
+            (
+                np.array([len(self)], dtype=_COUNT_DTYPE).tobytes(),
+                self.boxes.astype(_BOX_DTYPE, copy=False).tobytes(),
+                self.conf.astype(_CONF_DTYPE, copy=False).tobytes(),
+                self.cls.astype(_CLASS_DTYPE, copy=False).tobytes(),
+                orjson.dumps(names),
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.conf)
+
+    def class_names(self) -> list[str]:
+        return [self.names.get(c, str(c)) for c in self.cls.tolist()]
+
+    def scaled(self, scale_x: float, scale_y: float) -> "DetectionResult":
+        if scale_x == 1 and scale_y == 1:
+            return self
+        factors = np.array([scale_x, scale_y, scale_x, scale_y], dtype=_BOX_DTYPE)
+        return DetectionResult(self.boxes * factors, self.conf, self.cls, self.names)
+
+    def sorted_by_xmin(self) -> "DetectionResult":
+        order = np.argsort(self.boxes[:, 0], kind="stable")
+        return DetectionResult(
+            self.boxes[order], self.conf[order], self.cls[order], self.names
+        )
+
+    def filter(
+        self, min_conf: float | None = None, class_names: list[str] | None = None
+    ) -> "DetectionResult":
+        keep = np.ones(len(self), dtype=bool)
+        if min_conf is not None:
+            keep &= self.conf >= min_conf
+        if class_names:
+            class_ids = [i for i, name in self.names.items() if name in class_names]
+            keep &= np.isin(self.cls, class_ids)
+        return DetectionResult(
+            self.boxes[keep], self.conf[keep], self.cls[keep], self.names
+        )
+
+    def class_counts(self) -> dict[str, int]:
+        class_ids, counts = np.unique(self.cls, return_counts=True)
+        return {
+            self.names.get(class_id, str(class_id)): count
+            for class_id, count in zip(class_ids.tolist(), counts.tolist())
+        }
+
+    def to_records(
+        self, names: list[str] | None = None, with_boxes: bool = False
+    ) -> list[dict]:
+        if names is None:
+            names = self.class_names()
+        records = [
+            {"name": name, "confidence": confidence}
+            for name, confidence in zip(names, self.conf.tolist())
+        ]
+        if with_boxes:
+            for record, box in zip(records, self.boxes.tolist()):
+                record["box"] = box
+        return records
+
+    def to_dict(self) -> dict:
+        names = self.class_names()
+        return {
+            "detection_objects": self.to_records(names),
+            "detect_objects_names": ", ".join(names),
+            "total_detected_objects": len(self),
+        }
+
+    def to_json_bytes(self) -> bytes:
+        return orjson.dumps(self.to_dict())
@@ -0,0 +1,139 @@
+"""Rollup of detection outputs per user, day and sample name.
+
+Dashboards read `detection_daily_stats`, which holds a handful of rows per
+user and day, instead of scanning `yolo_outputs`. Rebuild it from the raw
+outputs, for instance after restoring a backup:
+
+    python -m app.object_detection.rollup backfill
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import Date, cast, delete, func, insert, literal, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from app.db.models import DetectionDailyStats, User, YoloOutput
+from app.db.session import AsyncSessionLocal
+
+ROLLUP_GROUPS = ("user", "day", "sample_name")
+
+
+def rollup_statement(yolo_outputs: list[YoloOutput]):
+    """Upsert adding `yolo_outputs` to their rollup rows, one row per group."""
+    groups = defaultdict(lambda: [0, 0, 0])
+    for output in yolo_outputs:
+        key = (output.user_id, output.created_at.date(), output.sample_name or "")
+        group = groups[key]
+        group[0] += 1
+        group[1] += output.total_objects
+        group[2] = max(group[2], output.total_objects)
+
+    statement = mysql_insert(DetectionDailyStats).values(
+        [
+            dict(
+                user_id=user_id,
+                day=day,
+                sample_name=sample_name,
+                output_count=count,
+                total_objects_sum=total,
+                total_objects_max=maximum,
+            )
+            for (user_id, day, sample_name), (count, total, maximum) in groups.items()
+        ]
+    )
+    table = DetectionDailyStats.__table__
+    return statement.on_duplicate_key_update(
+        output_count=table.c.output_count + statement.inserted.output_count,
+        total_objects_sum=table.c.total_objects_sum
+        + statement.inserted.total_objects_sum,
+        total_objects_max=func.greatest(
+            table.c.total_objects_max, statement.inserted.total_objects_max
+        ),
+    )
+
+
+def backfill_statements() -> list:
+    """Statements replacing every rollup row with one computed from yolo_outputs."""
+    day = cast(YoloOutput.created_at, Date)
+    sample_name = func.coalesce(YoloOutput.sample_name, literal(""))
+    aggregate = select(
+        YoloOutput.user_id,
+        day,
+        sample_name,
+        func.count(),
+        func.sum(YoloOutput.total_objects),
+        func.max(YoloOutput.total_objects),
+    ).group_by(YoloOutput.user_id, day, sample_name)
+    return [
+        delete(DetectionDailyStats),
+        insert(DetectionDailyStats).from_select(
+            [
+                "user_id",
+                "day",
+                "sample_name",
+                "output_count",
+                "total_objects_sum",
+                "total_objects_max",
+            ],
+            aggregate,
+        ),
+    ]
+
+
+def stats_statement(
+    group_by: list[str],
+    day_from: date | None = None,
+    day_to: date | None = None,
+    email: str | None = None,
+):
+    """Aggregate rollup rows over the requested groups, e.g. ["user", "day"]."""
+    columns = []
+    for group in group_by:
+        if group == "user":
+            columns += [User.uid.label("user_id"), User.username, User.email]
+        elif group == "day":
+            columns.append(DetectionDailyStats.day)
+        elif group == "sample_name":
+            columns.append(DetectionDailyStats.sample_name)
+        else:
+            raise ValueError(f"Unknown rollup group: {group}")
+
+    statement = (
+        select(
+            *columns,
+            func.sum(DetectionDailyStats.output_count).label("output_count"),
+            func.sum(DetectionDailyStats.total_objects_sum).label("total_objects_sum"),
+            func.max(DetectionDailyStats.total_objects_max).label("total_objects_max"),
+        )
+        .join(User, DetectionDailyStats.user_id == User.uid)
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+    if day_from is not None:
+        statement = statement.where(DetectionDailyStats.day >= day_from)
+    if day_to is not None:
+        statement = statement.where(DetectionDailyStats.day <= day_to)
+    if email is not None:
+        statement = statement.where(User.email == email)
+    return statement
+
+
+async def backfill() -> None:
+    async with AsyncSessionLocal() as session:
+        # One transaction, readers see either the old or the rebuilt rollup
+        for statement in backfill_statements():
+            await session.execute(statement)
+        await session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backfill", help="rebuild the rollup from yolo_outputs")
+    args = parser.parse_args()
+
+    asyncio.run(backfill())
+    print("Rollup rebuilt")
@@ -1,113 +1,741 @@
-from typing import Annotated
-from fastapi import APIRouter, File, Depends, HTTPException, status
+from datetime import date, datetime
+from typing import Annotated, BinaryIO, Literal
+from fastapi import (
+    APIRouter,
+    File,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
 from fastapi.params import Depends
-from fastapi.responses import StreamingResponse
-from app.object_detection.services import YoloServices
-from app.auth.dependencies import AccessTokenBearer, RoleChecker
+from fastapi.responses import Response, StreamingResponse
+from app.object_detection.services import YoloServices, ImageTooLarge
+from app.object_detection.executor import InferenceExecutor, InferenceQueueFull
+from app.object_detection.cache import DetectionCache
+from app.object_detection.results import DetectionResult
+from app.object_detection.profiles import (
+    ProfileLatencyStats,
+    UnknownProfile,
+    resolve_profile,
+)
+from app.object_detection.uploads import (
+    BatchUploadError,
+    expand_batch_uploads,
+    open_image,
+)
+from app.object_detection.registry import (
+    ModelVersion,
+    publish_model_event,
+    resolve_model_path,
+)
+from app.object_detection.export import (
+    EXPORT_MEDIA_TYPES,
+    ExportFormatUnavailable,
+    get_encoder,
+)
+from app.object_detection.pagination import InvalidCursor, decode_cursor
+from app.object_detection.write_behind import YoloOutputWriteBehind
+from app.object_detection.jobs import DetectionJobService, JOB_DONE, JOB_QUEUED
+from app.celery_tasks import detect_objects
+from app.config import Config
+from app.auth.dependencies import RoleChecker, access_token_bearer, get_current_user
+from app.auth.schemas import PrincipalModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_session
-from app.object_detection.schemas import UserHistoryModel, AdminReadData
-import json
+from app.db.session import (
+    get_session,
+    get_read_session,
+    AsyncSessionLocal,
+    ReadSessionLocal,
+    engine,
+    read_engine,
+)
+from app.db.pool import pool_status
+from app.object_detection.schemas import (
+    UserHistoryPage,
+    AdminHistoryPage,
+    DetectionJobModel,
+    DetectionStatsModel,
+    OutputDetectionsModel,
+    ModelLoadModel,
+    ModelRegistryModel,
+    ModelVersionModel,
+)
+import asyncio
+import io
+import time
 import uuid
+import orjson
+from PIL import UnidentifiedImageError
+from redis.exceptions import RedisError
 from loguru import logger
 
 
 yolo_router = APIRouter()
-yolo_services = YoloServices()
-access_token_bearer = AccessTokenBearer()
+# In "process" mode the model is only used by the inference processes
+yolo_services = YoloServices(load_model=Config.INFERENCE_EXECUTOR == "thread")
+inference_executor = InferenceExecutor(
+    services=yolo_services,
+    mode=Config.INFERENCE_EXECUTOR,
+    max_workers=Config.INFERENCE_WORKERS,
+    max_queue=Config.INFERENCE_MAX_QUEUE,
+)
+detection_cache = DetectionCache(
+    max_bytes=Config.DETECTION_CACHE_MAX_BYTES,
+    ttl=Config.DETECTION_CACHE_TTL,
+    store_images=Config.DETECTION_CACHE_STORE_IMAGES,
+    enabled=Config.DETECTION_CACHE_ENABLED,
+)
+job_service = DetectionJobService()
+yolo_output_writer = YoloOutputWriteBehind(
+    save_outputs=yolo_services.insert_yolo_outputs,
+    batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval_ms=Config.WRITE_BEHIND_FLUSH_MS,
+    claim_idle_ms=Config.WRITE_BEHIND_CLAIM_IDLE_MS,
+)
+profile_stats = ProfileLatencyStats()
 role_checker = Depends(RoleChecker(["admin", "user"]))
 role_checker_admin = Depends(RoleChecker(["admin"]))
 
 
+async def run_inference(method_name: str, *args, **kwargs):
+    try:
+        return await inference_executor.run(method_name, *args, **kwargs)
+    except InferenceQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "message": "Detection service is busy",
+                "resolution": "Please try again in a moment",
+                "error_code": "inference_queue_full",
+            },
+        )
+    except ImageTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"message": str(e), "error_code": "image_too_large"},
+        )
+    except UnidentifiedImageError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": "The uploaded file is not a supported image",
+                "error_code": "invalid_image",
+            },
+        )
+
+
+async def save_outputs(
+    session: AsyncSession,
+    user_id: uuid.UUID,
+    outputs: list[tuple[str | None, DetectionResult]],
+) -> None:
+    if Config.WRITE_BEHIND_ENABLED:
+        yolo_outputs = yolo_services.make_yolo_outputs(user_id, outputs)
+        try:
+            # Redis keeps the records until the writer has committed them
+            await yolo_output_writer.submit(yolo_outputs)
+            return
+        except RedisError as e:
+            logger.warning("Write-behind unavailable, saving directly: {}", e)
+        # Part of the batch may be in the stream already, the same uids make
+        # the writer and this insert skip what the other one saved
+        await yolo_services.insert_yolo_outputs(session, yolo_outputs)
+        return
+    await yolo_services.save_yolo_outputs(
+        session=session, user_id=user_id, outputs=outputs
+    )
+
+
+# Strong references to tasks that must outlive the request that started them
+background_tasks: set[asyncio.Task] = set()
+
+
+def track_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def get_inference_profile(
+    profile: str | None = None,
+    current_user: PrincipalModel = Depends(get_current_user),
+) -> str:
+    try:
+        return resolve_profile(profile, current_user.role)
+    except UnknownProfile as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": str(e), "error_code": "unknown_profile"},
+        )
+
+
+async def run_profiled_inference(method_name: str, *args, profile: str, **kwargs):
+    start_time = time.perf_counter()
+    result = await run_inference(method_name, *args, profile=profile, **kwargs)
+    profile_stats.record(profile, time.perf_counter() - start_time)
+    return result
+
+
+async def detect_image(
+    file: BinaryIO, profile: str, tiled: bool = False
+) -> DetectionResult:
+    cache_key = await detection_cache.make_key(
+        file,
+        yolo_services.get_cache_namespace(
+            full_resolution=tiled, tiled=tiled, profile=profile
+        ),
+    )
+    cached = await detection_cache.get(cache_key)
+    if cached is not None:
+        return yolo_services.load_predict(cached.table)
+
+    predict = await run_profiled_inference(
+        "detect_from_bytes", file, tiled=tiled, profile=profile
+    )
+    await detection_cache.set(cache_key, yolo_services.dump_predict(predict))
+    return predict
+
+
+async def detect_and_annotate_image(
+    file: BinaryIO, profile: str, tiled: bool = False
+) -> tuple[DetectionResult, bytes | None]:
+    cache_key = await detection_cache.make_key(
+        file,
+        yolo_services.get_cache_namespace(
+            full_resolution=True, tiled=tiled, profile=profile
+        ),
+    )
+    cached = await detection_cache.get(cache_key)
+    if cached is not None:
+        predict = yolo_services.load_predict(cached.table)
+        if cached.image is not None or len(predict) == 0:
+            return predict, cached.image
+        # the table is cached but not the picture, only draw the boxes
+        final_image = await run_inference("annotate_from_bytes", file, predict)
+    else:
+        predict, final_image = await run_profiled_inference(
+            "detect_and_annotate", file, tiled=tiled, profile=profile
+        )
+
+    await detection_cache.set(
+        cache_key, yolo_services.dump_predict(predict), final_image
+    )
+    return predict, final_image
+
+
 @yolo_router.post("/detection", dependencies=[role_checker])
-def predict(
-    file: bytes = File(...),
+async def predict(
+    file: UploadFile = File(...),
+    tiled: bool = False,
+    profile: str = Depends(get_inference_profile),
     _: dict = Depends(access_token_bearer),
 ):
-    # Step 1: Initialize the result dictionary with None values.
-    result = {"detection_objects": None}
+    # Step 1 & 2: Convert the image file to an image object and predict from
+    # model, off the event loop
+    predict = await detect_image(file.file, profile=profile, tiled=tiled)
 
-    # Step 2: Convert the image file to an image object
-    input_image = yolo_services.get_image_from_bytes(file)
+    # Step 3: Serialize the detected names and confidences straight to JSON
+    result = predict.to_json_bytes()
 
-    # Step 3: Predict from model
-    predict = yolo_services.detect_sample_model(input_image)
+    # Step 4: Logs and return
+    logger.info("results: {} objects detected", len(predict))
+    return Response(
+        content=result,
+        media_type="application/json",
+        headers={"X-Inference-Profile": profile},
+    )
 
-    # Step 4: Select detect obj return info
-    # here you can choose what data to send to the result
-    detect_res = predict[["name", "confidence"]]
-    objects = detect_res["name"].values
 
-    result["detect_objects_names"] = ", ".join(objects)
-    result["detection_objects"] = json.loads(detect_res.to_json(orient="records"))
-    result["total_detected_objects"] = len(predict)
-    # Step 5: Logs and return
-    logger.info("results: {}", result)
-    return result
+@yolo_router.post("/detection/batch", dependencies=[role_checker])
+async def predict_batch(
+    files: list[UploadFile] = File(...),
+    profile: str = Depends(get_inference_profile),
+    _: dict = Depends(access_token_bearer),
+):
+    user_data = _.get("user", {})
+    user_id = uuid.UUID(user_data.get("user_id"))
+
+    try:
+        images = expand_batch_uploads(
+            files,
+            max_images=Config.BATCH_MAX_IMAGES,
+            max_image_bytes=Config.MAX_UPLOAD_BYTES,
+        )
+    except BatchUploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": str(e), "error_code": "invalid_batch"},
+        )
+    if not images:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "No images in the batch", "error_code": "empty_batch"},
+        )
+
+    # Images go to the executor in chunks of one model batch each
+    batch_size = Config.INFERENCE_MAX_BATCH_SIZE
+    # Zip members are inflated per chunk, only this many chunks are in memory
+    chunk_slots = asyncio.Semaphore(inference_executor.max_workers)
+
+    async def detect_chunk(start: int) -> tuple[int, list]:
+        sources = [source for _, source in images[start : start + batch_size]]
+        async with chunk_slots:
+            try:
+                chunk = await asyncio.to_thread(
+                    lambda: [open_image(source) for source in sources]
+                )
+                return start, await inference_executor.run(
+                    "detect_many", chunk, profile=profile
+                )
+            except Exception as e:
+                return start, [e] * len(sources)
+
+    async def save_chunk(chunk_outputs: list) -> None:
+        # The request session is already closed once streaming starts
+        async with AsyncSessionLocal() as session:
+            await save_outputs(session, user_id, chunk_outputs)
+
+    async def stream_results():
+        outputs = []
+        saves = []
+        tasks = [
+            asyncio.create_task(detect_chunk(start))
+            for start in range(0, len(images), batch_size)
+        ]
+        try:
+            # Send every chunk as soon as it is done, in completion order
+            for task in asyncio.as_completed(tasks):
+                start, results = await task
+                chunk_outputs = [
+                    (images[index][0], predict)
+                    for index, predict in enumerate(results, start=start)
+                    if not isinstance(predict, Exception)
+                ]
+                if chunk_outputs:
+                    # Saved even if the client goes away while it is streamed
+                    saves.append(track_task(save_chunk(chunk_outputs)))
+                    outputs += chunk_outputs
+                for index, predict in enumerate(results, start=start):
+                    line = {"index": index, "filename": images[index][0]}
+                    if isinstance(predict, Exception):
+                        line["error"] = str(predict) or type(predict).__name__
+                    else:
+                        line.update(predict.to_dict())
+                    yield orjson.dumps(line) + b"\n"
+
+            await asyncio.shield(asyncio.gather(*saves))
+            yield orjson.dumps(
+                {
+                    "summary": {
+                        "images": len(images),
+                        "detected": len(outputs),
+                        "failed": len(images) - len(outputs),
+                        "total_objects": sum(len(predict) for _, predict in outputs),
+                    }
+                }
+            ) + b"\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            for _, source in images:
+                source.close()
+
+    return StreamingResponse(
+        content=stream_results(),
+        media_type="application/x-ndjson",
+        headers={"X-Inference-Profile": profile},
+    )
 
 
 @yolo_router.post("/img_object_detection_to_img", dependencies=[role_checker])
 async def img_object_detection_to_img(
-    file: Annotated[bytes, File()],
+    file: Annotated[UploadFile, File()],
     sample_name: str,
+    tiled: bool = False,
+    profile: str = Depends(get_inference_profile),
     _: dict = Depends(access_token_bearer),
     session: AsyncSession = Depends(get_session),
 ):
 
-    input_image = yolo_services.get_image_from_bytes(file)
-
-    # model predict
-    predict = yolo_services.detect_sample_model(input_image)
+    # decode, predict and draw bbox on image, off the event loop
+    predict, final_image = await detect_and_annotate_image(
+        file.file, profile=profile, tiled=tiled
+    )
 
     total_objects = len(predict)
     user_data = _.get("user", {})
     user_id = uuid.UUID(user_data.get("user_id"))
 
-    new_predict = await yolo_services.save_yolo_output(
-        user_id=user_id,
+    await save_outputs(session, user_id, [(sample_name, predict)])
+
+    if total_objects == 0:
+        raise HTTPException(
+            status_code=404,
+            detail="No target detected or image out of training scope. Try another image.",
+        )
+
+    # return image in bytes format
+    return StreamingResponse(
+        content=io.BytesIO(final_image),
+        media_type="image/jpeg",
+        headers={"X-Inference-Profile": profile},
+    )
+
+
+@yolo_router.post(
+    "/jobs",
+    dependencies=[role_checker],
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=DetectionJobModel,
+)
+async def create_detection_job(
+    file: Annotated[UploadFile, File()],
+    sample_name: str | None = None,
+    profile: str = Depends(get_inference_profile),
+    _: dict = Depends(access_token_bearer),
+):
+    user_data = _.get("user", {})
+    user_id = uuid.UUID(user_data.get("user_id"))
+
+    # store the image and let an inference worker pick the job up
+    job_id = await job_service.create_job(
+        await file.read(), sample_name, user_id, profile
+    )
+    detect_objects.delay(job_id)
+
+    return DetectionJobModel(job_id=job_id, status=JOB_QUEUED, sample_name=sample_name)
+
+
+async def get_job_for_user(job_id: str, current_user: PrincipalModel) -> dict:
+    job = await job_service.get_job(job_id)
+    if job is None or (
+        job["user_id"] != str(current_user.uid) and current_user.role != "admin"
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"message": "Job not found", "error_code": "job_not_found"},
+        )
+    return job
+
+
+@yolo_router.get(
+    "/jobs/{job_id}", dependencies=[role_checker], response_model=DetectionJobModel
+)
+async def read_detection_job(
+    job_id: str,
+    request: Request,
+    current_user: PrincipalModel = Depends(get_current_user),
+):
+    job = await get_job_for_user(job_id, current_user)
+    total_objects = job.get("total_objects")
+    image_url = None
+    if job["status"] == JOB_DONE and total_objects and int(total_objects) > 0:
+        image_url = str(request.url_for("read_detection_job_image", job_id=job_id))
+
+    return DetectionJobModel(
+        job_id=job_id,
+        status=job["status"],
+        sample_name=job.get("sample_name") or None,
         total_objects=total_objects,
-        sample_name=sample_name,
-        session=session,
+        error=job.get("error"),
+        image_url=image_url,
     )
 
-    if new_predict.total_objects == 0:
+
+@yolo_router.get("/jobs/{job_id}/image", dependencies=[role_checker])
+async def read_detection_job_image(
+    job_id: str, current_user: PrincipalModel = Depends(get_current_user)
+):
+    job = await get_job_for_user(job_id, current_user)
+    if job["status"] != JOB_DONE:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": f"Job is {job['status']}",
+                "error_code": "job_not_done",
+            },
+        )
+    final_image = await job_service.get_job_image(job_id)
+    if final_image is None:
         raise HTTPException(
             status_code=404,
             detail="No target detected or image out of training scope. Try another image.",
         )
+    return StreamingResponse(content=io.BytesIO(final_image), media_type="image/jpeg")
 
-    # add bbox on image
-    final_image = yolo_services.add_bbox_on_img(image=input_image, predict=predict)
 
-    # return image in bytes format
-    return StreamingResponse(
-        content=yolo_services.get_bytes_from_image(final_image), media_type="image/jpeg"
+@yolo_router.get(
+    "/outputs/{uid}/detections",
+    dependencies=[role_checker],
+    response_model=OutputDetectionsModel,
+)
+async def read_output_detections(
+    uid: uuid.UUID,
+    min_conf: float | None = Query(None, ge=0, le=1),
+    classes: Annotated[list[str] | None, Query()] = None,
+    include_boxes: bool = True,
+    session: AsyncSession = Depends(get_session),
+    current_user: PrincipalModel = Depends(get_current_user),
+):
+    # The current role, not the one in the token, so a demotion applies at once
+    user_id = None if current_user.role == "admin" else current_user.uid
+
+    output = await yolo_services.get_detections(session, uid, user_id=user_id)
+    if output is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"message": "Output not found", "error_code": "output_not_found"},
+        )
+    if output.detections is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "Detections were not stored for this output",
+                "error_code": "detections_not_stored",
+            },
+        )
+
+    # Recounted from the stored boxes, the model is not involved. Thresholds
+    # below the profile's conf at detection time can't bring boxes back.
+    predict = DetectionResult.from_bytes(output.detections).filter(
+        min_conf=min_conf, class_names=classes
+    )
+    return OutputDetectionsModel(
+        uid=output.uid,
+        sample_name=output.sample_name,
+        created_at=output.created_at,
+        total_objects=output.total_objects,
+        count=len(predict),
+        counts_by_class=predict.class_counts(),
+        detections=predict.to_records(with_boxes=True) if include_boxes else None,
+    )
+
+
+@yolo_router.get("/inference/stats", dependencies=[role_checker_admin])
+async def read_inference_stats(_: dict = Depends(access_token_bearer)):
+    return {
+        "executor": inference_executor.stats(),
+        "cache": detection_cache.stats(),
+        "profiles": profile_stats.stats(),
+    }
+
+
+@yolo_router.get("/db/stats", dependencies=[role_checker_admin])
+async def read_db_stats(_: dict = Depends(access_token_bearer)):
+    # Pools of the worker that answers
+    return {
+        "primary": pool_status(engine),
+        "replica": pool_status(read_engine) if read_engine is not engine else None,
+    }
+
+
+def check_model_swap_supported():
+    if Config.INFERENCE_EXECUTOR != "thread":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "Model swaps need INFERENCE_EXECUTOR=thread",
+                "error_code": "model_swap_unsupported",
+            },
+        )
+
+
+@yolo_router.get(
+    "/models", dependencies=[role_checker_admin], response_model=ModelRegistryModel
+)
+async def read_models(_: dict = Depends(access_token_bearer)):
+    # State of the worker that answers, every worker applies the same events
+    return yolo_services.registry.state()
+
+
+@yolo_router.post(
+    "/models",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[role_checker_admin],
+    response_model=ModelVersionModel,
+)
+async def load_new_model(
+    model_data: ModelLoadModel, _: dict = Depends(access_token_bearer)
+):
+    check_model_swap_supported()
+    try:
+        version = ModelVersion(
+            resolve_model_path(model_data.model_path),
+            model_data.backend or Config.INFERENCE_BACKEND,
+            Config.INFERENCE_INT8 if model_data.int8 is None else model_data.int8,
+        )
+    except (OSError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": str(e), "error_code": "invalid_model"},
+        )
+    if yolo_services.registry.state()["loading"] is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "Another model is still being loaded",
+                "error_code": "model_swap_in_progress",
+            },
+        )
+
+    # Each worker loads and warms the model up, then swaps it in on its own
+    event = {
+        "action": "load",
+        "model_path": version.model_path,
+        "backend": version.backend,
+        "int8": version.int8,
+    }
+    await publish_model_event(event)
+    return version.to_dict()
+
+
+@yolo_router.post(
+    "/models/rollback",
+    dependencies=[role_checker_admin],
+    response_model=ModelVersionModel,
+)
+async def rollback_model(_: dict = Depends(access_token_bearer)):
+    check_model_swap_supported()
+    previous = yolo_services.registry.state()["previous"]
+    if not previous:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "No previous model is loaded",
+                "error_code": "no_previous_model",
+            },
+        )
+
+    await publish_model_event({"action": "rollback"})
+    return previous[0]
+
+
+def get_history_filters(
+    cursor: str | None = None,
+    limit: int = Query(Config.HISTORY_PAGE_SIZE, ge=1, le=Config.HISTORY_MAX_PAGE_SIZE),
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    sample_name_prefix: str | None = None,
+) -> dict:
+    if cursor is not None:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"message": str(e), "error_code": "invalid_cursor"},
+            )
+    return dict(
+        cursor=cursor,
+        limit=limit,
+        created_from=created_from,
+        created_to=created_to,
+        sample_name_prefix=sample_name_prefix,
     )
 
 
 @yolo_router.get(
     "/get_data_admin",
     dependencies=[role_checker_admin],
-    response_model=list[AdminReadData],
+    response_model=AdminHistoryPage,
 )
 async def read_data_admin(
-    session: AsyncSession = Depends(get_session), _: dict = Depends(access_token_bearer)
+    email: str | None = None,
+    filters: dict = Depends(get_history_filters),
+    session: AsyncSession = Depends(get_read_session),
+    _: dict = Depends(access_token_bearer),
 ):
-    data = await yolo_services.get_history_admin(session)
-    return data
+    data, next_cursor = await yolo_services.get_history_admin(
+        session, email=email, **filters
+    )
+    return AdminHistoryPage(items=data, next_cursor=next_cursor)
+
+
+@yolo_router.get("/export", dependencies=[role_checker_admin])
+async def export_history(
+    export_format: Literal["csv", "ndjson", "parquet"] = Query("csv", alias="format"),
+    email: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    sample_name_prefix: str | None = None,
+    _: dict = Depends(access_token_bearer),
+):
+    try:
+        encoder = get_encoder(export_format)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": str(e), "error_code": "export_format_unavailable"},
+        )
+    statement = yolo_services.get_history_admin_statement(
+        email=email,
+        created_from=created_from,
+        created_to=created_to,
+        sample_name_prefix=sample_name_prefix,
+    ).execution_options(yield_per=Config.EXPORT_CHUNK_ROWS)
+
+    async def stream_rows():
+        yield encoder.header()
+        # The request session is closed before streaming starts, and the
+        # server-side cursor keeps its own connection until the last row
+        async with ReadSessionLocal() as session:
+            result = await session.stream(statement)
+            async for rows in result.partitions():
+                # encoding a whole chunk would block the event loop
+                yield await asyncio.to_thread(encoder.encode, rows)
+        yield encoder.finish()
+
+    filename = f"detection_history.{export_format}"
+    return StreamingResponse(
+        content=stream_rows(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@yolo_router.get(
+    "/stats",
+    dependencies=[role_checker_admin],
+    response_model=list[DetectionStatsModel],
+)
+async def read_detection_stats(
+    group_by: Annotated[list[Literal["user", "day", "sample_name"]], Query()] = [
+        "user"
+    ],
+    day_from: date | None = None,
+    day_to: date | None = None,
+    email: str | None = None,
+    session: AsyncSession = Depends(get_read_session),
+    _: dict = Depends(access_token_bearer),
+):
+    # Served from the detection_daily_stats rollup, not from yolo_outputs
+    return await yolo_services.get_detection_stats(
+        session,
+        group_by=list(dict.fromkeys(group_by)),
+        day_from=day_from,
+        day_to=day_to,
+        email=email,
+    )
 
 
 @yolo_router.get(
-    "/get_data_user", dependencies=[role_checker], response_model=list[UserHistoryModel]
+    "/get_data_user", dependencies=[role_checker], response_model=UserHistoryPage
 )
 async def read_data_user(
-    session: AsyncSession = Depends(get_session), _: dict = Depends(access_token_bearer)
+    filters: dict = Depends(get_history_filters),
+    session: AsyncSession = Depends(get_read_session),
+    _: dict = Depends(access_token_bearer),
 ):
     user_data = _.get("user", {})
     email = user_data.get("email")
-    data = await yolo_services.get_history_user(email, session)
+    data = await yolo_services.get_history_user(email, session, **filters)
     if data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No data available."
         )
-    return data
+    items, next_cursor = data
+    return UserHistoryPage(items=items, next_cursor=next_cursor)
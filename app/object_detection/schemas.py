@@ -1,8 +1,10 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
+import uuid
 
 
 class UserHistoryModel(BaseModel):
+    uid: uuid.UUID
     total_objects: int
     sample_name: str | None
     created_at: datetime
@@ -14,3 +16,73 @@ class UserHistoryModel(BaseModel):
 class AdminReadData(UserHistoryModel):
     username: str
     email: str
+
+
+class UserHistoryPage(BaseModel):
+    items: list[UserHistoryModel]
+    next_cursor: str | None = None
+
+
+class AdminHistoryPage(BaseModel):
+    items: list[AdminReadData]
+    next_cursor: str | None = None
+
+
+class DetectionJobModel(BaseModel):
+    job_id: str
+    status: str
+    sample_name: str | None = None
+    total_objects: int | None = None
+    error: str | None = None
+    image_url: str | None = None
+
+
+class ModelLoadModel(BaseModel):
+    model_path: str
+    backend: str | None = None
+    int8: bool | None = None
+
+
+class ModelVersionModel(BaseModel):
+    model_path: str
+    backend: str
+    int8: bool
+    fingerprint: str
+    loaded_at: datetime | None = None
+
+
+class ModelRegistryModel(BaseModel):
+    pid: int
+    active: ModelVersionModel | None = None
+    previous: list[ModelVersionModel]
+    loading: ModelVersionModel | None = None
+    last_error: str | None = None
+
+
+class DetectionStatsModel(BaseModel):
+    # Only the columns of the requested groups are set
+    user_id: uuid.UUID | None = None
+    username: str | None = None
+    email: str | None = None
+    day: date | None = None
+    sample_name: str | None = None
+    output_count: int
+    total_objects_sum: int
+    total_objects_mean: float
+    total_objects_max: int
+
+
+class DetectionModel(BaseModel):
+    name: str
+    confidence: float
+    box: list[float] | None = None  # xmin, ymin, xmax, ymax in pixels
+
+
+class OutputDetectionsModel(BaseModel):
+    uid: uuid.UUID
+    sample_name: str | None
+    created_at: datetime
+    total_objects: int  # as counted when the image was detected
+    count: int  # after the confidence and class filters
+    counts_by_class: dict[str, int]
+    detections: list[DetectionModel] | None = None
@@ -1,27 +1,184 @@
-from PIL import Image
+from PIL import Image, ImageOps
+import hashlib
 import uuid
 import io
-import pandas as pd
+from datetime import datetime
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, BinaryIO
 import numpy as np
-from ultralytics import YOLO
-from ultralytics.utils.plotting import Annotator, colors
+from loguru import logger
 from app.config import Config
+from app.object_detection.batching import BatchInferenceScheduler
+from app.object_detection.pagination import after_cursor, next_page
+from app.object_detection.registry import ModelRegistry, ModelVersion
+from app.object_detection.rendering import BoxRenderer
+from app.object_detection.rollup import rollup_statement, stats_statement
+from app.object_detection.results import DetectionResult
+from app.object_detection.tiling import make_tiles, merge_tile_results
 from sqlmodel.ext.asyncio.session import AsyncSession
 from app.db.models import YoloOutput, User
 from sqlmodel import select
 
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+# Pillow's own guard only raises at twice this limit, see get_image_from_bytes
+Image.MAX_IMAGE_PIXELS = Config.MAX_IMAGE_PIXELS
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload declares more pixels than MAX_IMAGE_PIXELS."""
+
+
 class PreprocessingImageInputService:
     def __init__(self, image: bytes) -> None:
         pass
 
 class YoloServices:
-    def __init__(self):
-        self.model = YOLO(Config.MODEL_PATH)
+    def __init__(self, load_model: bool = True):
+        self.registry = ModelRegistry(
+            warmup=self.warmup_model, keep_previous=Config.MODEL_KEEP_PREVIOUS
+        )
+        self.batcher = BatchInferenceScheduler(
+            predict_batch=self.predict_batch,
+            max_batch_size=Config.INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=Config.INFERENCE_MAX_WAIT_MS,
+        )
+        self.renderer = BoxRenderer(
+            label_mode=Config.BBOX_LABEL_MODE, line_width=Config.BBOX_LINE_WIDTH
+        )
+        # "lazy" defers ultralytics/torch and the weights to the first detection,
+        # "preload" loads them here in the Gunicorn master, see gunicorn.conf.py
+        if load_model and Config.MODEL_LOAD_MODE != "lazy":
+            self.registry.active
+
+    @property
+    def model(self) -> "YOLO":
+        # Read once per detection, a model swapped in meanwhile is used from
+        # the next request on
+        return self.registry.active.model
+
+    @property
+    def model_fingerprint(self) -> str:
+        return self.registry.active_fingerprint()
+
+    def warmup_model(self, version: ModelVersion) -> None:
+
+        # Run one synthetic image per configured profile through the batcher, so
+        # requests do not pay for the predictor setup of each input size
+        for name, params in Config.INFERENCE_PROFILES.items():
+            image = Image.new("RGB", (params.image_size, params.image_size))
+            self.get_model_predict(
+                model=version.model,
+                input_image=image,
+                save=False,
+                **self.get_detect_params(name),
+            )
+
+    def warmup(self) -> None:
 
-    def get_image_from_bytes(self, binary_image: bytes) -> Image:
+        self.warmup_model(self.registry.active)
 
-        input_image = Image.open(io.BytesIO(binary_image)).convert("RGB")
-        return input_image
+    def start_warmup(self) -> threading.Thread:
+        def run():
+            try:
+                self.warmup()
+            except Exception:
+                logger.exception("Model warmup failed")
+            else:
+                logger.info("Model warmup done")
+
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def get_detect_params(self, profile: str | None = None) -> dict:
+
+        # Inference parameters of a named profile, see Config.INFERENCE_PROFILES
+        profile = profile or Config.INFERENCE_DEFAULT_PROFILE
+        return Config.INFERENCE_PROFILES[profile].model_dump()
+
+    def get_cache_namespace(
+        self,
+        full_resolution: bool = True,
+        tiled: bool = False,
+        profile: str | None = None,
+    ) -> str:
+
+        detect_params = self.get_detect_params(profile)
+        params = ",".join(f"{k}={v}" for k, v in sorted(detect_params.items()))
+        # draft decoding gives the model a slightly different input
+        params += f",full_resolution={full_resolution}"
+        if tiled:
+            params += (
+                f",tile={Config.TILE_SIZE}:{Config.TILE_OVERLAP}"
+                f":{Config.TILE_MAX_COUNT}:{Config.TILE_NMS_IOU}"
+            )
+        # cached annotated images also depend on how boxes are drawn
+        params += f",labels={self.renderer.label_mode},lw={self.renderer.line_width}"
+        # entries written before class names were packed with the boxes
+        params += ",names=packed"
+        params_digest = hashlib.blake2b(params.encode(), digest_size=8).hexdigest()
+        return f"{self.model_fingerprint}:{params_digest}"
+
+    def dump_predict(self, predict: DetectionResult) -> bytes:
+
+        return predict.to_bytes()
+
+    def load_predict(self, data: bytes) -> DetectionResult:
+
+        # Class names are cached with the boxes, a cache hit never loads the model
+        return DetectionResult.from_bytes(data)
+
+    def get_image_from_bytes(
+        self,
+        binary_image: bytes | BinaryIO,
+        full_resolution: bool = True,
+        profile: str | None = None,
+    ) -> Image:
+
+        # Uploads arrive as spooled files, decode straight from them without
+        # copying the whole body into memory first
+        if isinstance(binary_image, (bytes, bytearray, memoryview)):
+            binary_image = io.BytesIO(binary_image)
+        binary_image.seek(0)
+
+        # Only the header is read here, reject decompression bombs before decoding
+        try:
+            input_image = Image.open(binary_image)
+        except Image.DecompressionBombError as e:
+            # Pillow rejects images over twice MAX_IMAGE_PIXELS by itself
+            raise ImageTooLarge(str(e))
+        width, height = input_image.size
+        if width * height > Config.MAX_IMAGE_PIXELS:
+            raise ImageTooLarge(
+                f"Image has {width}x{height} pixels, the limit is {Config.MAX_IMAGE_PIXELS}"
+            )
+
+        scale = (1.0, 1.0)
+        if not full_resolution:
+            # JPEG only: decode at 1/2, 1/4 or 1/8 scale, never below the size
+            # the model resizes to anyway
+            target = self.get_detect_params(profile)["image_size"]
+            input_image.draft("RGB", (target, target))
+            draft_width, draft_height = input_image.size
+            scale = (width / draft_width, height / draft_height)
+
+        # Honor the camera orientation, the model sees what the user sees
+        decoded_size = input_image.size
+        ImageOps.exif_transpose(input_image, in_place=True)
+        if input_image.size != decoded_size:
+            # rotated by 90 degrees, the axes swapped
+            scale = scale[::-1]
+        image = input_image.convert("RGB")
+        # Factors that bring boxes found on this image back to full resolution
+        image.info["scale"] = scale
+        return image
+
+    def to_full_resolution(self, predict: DetectionResult, image: Image):
+
+        return predict.scaled(*image.info.get("scale", (1.0, 1.0)))
 
     def get_bytes_from_image(self, image: Image) -> bytes:
 
@@ -32,35 +189,32 @@ class YoloServices:
         return_image.seek(0)  # set the pointer to the beginning of the file
         return return_image
 
-    def transform_predict_to_df(self, results: list, labeles_dict=dict) -> pd.DataFrame:
+    def transform_predict(self, result, labeles_dict: dict) -> DetectionResult:
 
-        # Transform the Tensor to numpy array
-        predict_bbox = pd.DataFrame(
-            results[0].to("cpu").numpy().boxes.xyxy,
-            columns=["xmin", "ymin", "xmax", "ymax"],
-        )
-        # Add the confidence of the prediction to the DataFrame
-        predict_bbox["confidence"] = results[0].to("cpu").numpy().boxes.conf
-        # Add the class of the prediction to the DataFrame
-        predict_bbox["class"] = (results[0].to("cpu").numpy().boxes.cls).astype(int)
-        # Replace the class number with the class name from the labeles_dict
-        predict_bbox["name"] = predict_bbox["class"].replace(labeles_dict)
-        return predict_bbox
+        # Copy boxes, confidences and classes to host memory in one go
+        return DetectionResult.from_yolo(result, labeles_dict)
 
-    def get_model_predict(
+    def predict_batch(self, input_images: list, predict_kwargs: dict) -> list:
+
+        # Run one forward pass for every image gathered by the batcher
+        model = predict_kwargs.pop("model")
+        return model.predict(input_images, **predict_kwargs)
+
+    def submit_model_predict(
         self,
-        model: YOLO,
+        model: "YOLO",
         input_image: Image,
         save: bool = False,
         image_size: int = 1248,
         conf: float = 0.5,
         augment: bool = False,
         **kwargs,
-    ) -> pd.DataFrame:
+    ) -> Future:
 
-        # Make predictions
-        predicts = model.predict(
+        # Queue the image, it is batched together with concurrent requests
+        return self.batcher.submit(
             input_image,
+            model=model,
             imgsz=image_size,
             conf=conf,
             save=save,
@@ -70,51 +224,162 @@ class YoloServices:
             mosaic=0.0,
             **kwargs,
         )
-        # Transform predictions to pandas dataframe
-        predictions = self.transform_predict_to_df(predicts, model.names)
+
+    def get_model_predict(
+        self, model: "YOLO", input_image: Image, **kwargs
+    ) -> DetectionResult:
+
+        # Make predictions
+        predict = self.submit_model_predict(model, input_image, **kwargs).result()
+        # Transform predictions to a compact array-backed result
+        predictions = self.transform_predict(predict, model.names)
         return predictions
 
-    def detect_sample_model(self, input_image: Image) -> pd.DataFrame:
+    def detect_sample_model(
+        self, input_image: Image, profile: str | None = None
+    ) -> DetectionResult:
 
         predict = self.get_model_predict(
             model=self.model,
             input_image=input_image,
             save=False,
-            image_size=640,
-            augment=True,
-            conf=0.5,
+            **self.get_detect_params(profile),
         )
         return predict
 
-    def add_bbox_on_img(self, image: Image, predict: pd.DataFrame()) -> Image:
-
-        # Create an annotator object
-        annotator = Annotator(np.array(image))
-
-        # sort predict by xmin value
-        predict = predict.sort_values(by=["xmin"], ascending=True)
-
-        # iterate over the rows of predict dataframe
-        for i, row in predict.iterrows():
-            # create the text to be displayed on image
-            # text = f"{row['name']}: {int(row['confidence']*100)}%"
-            # get the bounding box coordinates
-            bbox = [row["xmin"], row["ymin"], row["xmax"], row["ymax"]]
-            # add the bounding box and text on the image
-            annotator.box_label(
-                bbox,
-                # text,
-                color=colors(row["class"], True),
-            )
-            # Total obj by Annotator.text()
-            count_obj = len(predict)
-            annotator.text(
-                (30, 100),  # area (x, y)
-                f"Total Objects: {count_obj}",  # text
-                txt_color=(255, 255, 255),  # text color (white)
+    def detect_tiled(
+        self, input_image: Image, profile: str | None = None
+    ) -> DetectionResult:
+
+        # Slice the full resolution image into overlapping tiles
+        tiles = make_tiles(
+            *input_image.size,
+            tile_size=Config.TILE_SIZE,
+            overlap=Config.TILE_OVERLAP,
+            max_tiles=Config.TILE_MAX_COUNT,
+        )
+        tile_params = self.get_detect_params(profile)
+        tile_params["image_size"] = Config.TILE_SIZE
+        # every tile has to go through the same model version
+        model = self.model
+
+        # Queue every tile at once so they run as batches on all cores
+        predicts = [
+            self.submit_model_predict(
+                model=model, input_image=input_image.crop(tile), **tile_params
             )
+            for tile in tiles
+        ]
+        results = [
+            self.transform_predict(predict.result(), model.names)
+            for predict in predicts
+        ]
+
+        # Merge the tiles back into one result with cross-tile NMS
+        return merge_tile_results(
+            results, tiles, model.names, iou_threshold=Config.TILE_NMS_IOU
+        )
+
+    def add_bbox_on_img(self, image: Image, predict: DetectionResult) -> Image:
+
+        # sort predict by xmin value so boxes are drawn left to right
+        predict = predict.sorted_by_xmin()
+
+        # draw all boxes and the total objects text into the decoded array
+        annotated = self.renderer.render(np.array(image), predict)
+
         # convert the annotated image to PIL image
-        return Image.fromarray(annotator.result())
+        return Image.fromarray(annotated)
+
+    def detect_from_bytes(
+        self,
+        binary_image: bytes | BinaryIO,
+        tiled: bool = False,
+        profile: str | None = None,
+    ) -> DetectionResult:
+
+        # Decode and predict in one call so it runs as a single executor job
+        if tiled:
+            input_image = self.get_image_from_bytes(binary_image)
+            return self.detect_tiled(input_image, profile=profile)
+
+        # no annotated output is needed so decode close to the model input size
+        input_image = self.get_image_from_bytes(
+            binary_image, full_resolution=False, profile=profile
+        )
+        predict = self.detect_sample_model(input_image, profile=profile)
+        return self.to_full_resolution(predict, input_image)
+
+    def detect_many(
+        self, binary_images: list[bytes | BinaryIO], profile: str | None = None
+    ) -> list[DetectionResult | Exception]:
+
+        # Decode all images in parallel, a broken image only fails itself
+        def decode(binary_image):
+            try:
+                return self.get_image_from_bytes(
+                    binary_image, full_resolution=False, profile=profile
+                )
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=Config.BATCH_DECODE_WORKERS) as pool:
+            input_images = list(pool.map(decode, binary_images))
+
+        # Queue every image at once so the batcher runs them as real batches
+        detect_params = self.get_detect_params(profile)
+        model = self.model
+        predicts = [
+            (
+                image
+                if isinstance(image, Exception)
+                else self.submit_model_predict(
+                    model=model, input_image=image, **detect_params
+                )
+            )
+            for image in input_images
+        ]
+
+        results = []
+        for image, predict in zip(input_images, predicts):
+            if isinstance(predict, Exception):
+                results.append(predict)
+                continue
+            try:
+                predict = self.transform_predict(predict.result(), model.names)
+                # stored boxes are in pixels of the uploaded image
+                results.append(self.to_full_resolution(predict, image))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def detect_and_annotate(
+        self,
+        binary_image: bytes | BinaryIO,
+        tiled: bool = False,
+        profile: str | None = None,
+    ) -> tuple[DetectionResult, bytes | None]:
+
+        input_image = self.get_image_from_bytes(binary_image)
+        if tiled:
+            predict = self.detect_tiled(input_image, profile=profile)
+        else:
+            predict = self.detect_sample_model(input_image, profile=profile)
+        if len(predict) == 0:
+            return predict, None
+
+        # add bbox on image and encode it to JPEG bytes
+        final_image = self.add_bbox_on_img(image=input_image, predict=predict)
+        return predict, self.get_bytes_from_image(final_image).getvalue()
+
+    def annotate_from_bytes(
+        self, binary_image: bytes | BinaryIO, predict: DetectionResult
+    ) -> bytes:
+
+        # Draw an already known (e.g. cached) prediction without re-running the model
+        input_image = self.get_image_from_bytes(binary_image)
+        final_image = self.add_bbox_on_img(image=input_image, predict=predict)
+        return self.get_bytes_from_image(final_image).getvalue()
 
     async def save_yolo_output(
         self,
@@ -122,38 +387,177 @@ class YoloServices:
         user_id: uuid.UUID,
         total_objects: int,
         sample_name: str,
+        detections: bytes | None = None,
     ):
         yolo_output = YoloOutput(
-            user_id=user_id, total_objects=total_objects, sample_name=sample_name
+            user_id=user_id,
+            total_objects=total_objects,
+            sample_name=sample_name,
+            detections=detections,
+            created_at=datetime.now(),
         )
         session.add(yolo_output)
+        # the rollup is updated in the same transaction as the output
+        await session.execute(rollup_statement([yolo_output]))
         await session.commit()
         await session.refresh(yolo_output)
         return yolo_output
 
-    async def get_history_admin(self, session: AsyncSession):
+    def dump_detections(self, predict: DetectionResult) -> bytes | None:
+
+        # Packed float32 boxes/confidences and int16 classes, see results.py
+        return predict.to_bytes() if Config.DETECTION_STORE_BOXES else None
+
+    def make_yolo_outputs(
+        self, user_id: uuid.UUID, outputs: list[tuple[str | None, DetectionResult]]
+    ) -> list[YoloOutput]:
+        created_at = datetime.now()
+        return [
+            YoloOutput(
+                user_id=user_id,
+                total_objects=len(predict),
+                sample_name=name,
+                detections=self.dump_detections(predict),
+                created_at=created_at,
+            )
+            for name, predict in outputs
+        ]
+
+    async def save_yolo_outputs(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        outputs: list[tuple[str | None, DetectionResult]],
+    ) -> list[YoloOutput]:
+
+        # One transaction and one multi-row insert for a whole batch
+        yolo_outputs = self.make_yolo_outputs(user_id, outputs)
+        if not yolo_outputs:
+            return yolo_outputs
+        session.add_all(yolo_outputs)
+        await session.execute(rollup_statement(yolo_outputs))
+        await session.commit()
+        return yolo_outputs
+
+    async def insert_yolo_outputs(
+        self, session: AsyncSession, yolo_outputs: list[YoloOutput]
+    ) -> list[YoloOutput]:
+
+        # The write-behind stream can deliver a record twice, skip saved ones
+        statement = select(YoloOutput.uid).where(
+            YoloOutput.uid.in_([output.uid for output in yolo_outputs])
+        )
+        existing = set((await session.exec(statement)).all())
+        new_outputs = [output for output in yolo_outputs if output.uid not in existing]
+        if not new_outputs:
+            return new_outputs
+        session.add_all(new_outputs)
+        await session.execute(rollup_statement(new_outputs))
+        await session.commit()
+        return new_outputs
+
+    def filter_history(
+        self,
+        statement,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+        sample_name_prefix: str | None = None,
+        cursor: str | None = None,
+    ):
+        if created_from is not None:
+            statement = statement.where(YoloOutput.created_at >= created_from)
+        if created_to is not None:
+            statement = statement.where(YoloOutput.created_at < created_to)
+        if sample_name_prefix:
+            statement = statement.where(
+                YoloOutput.sample_name.startswith(sample_name_prefix, autoescape=True)
+            )
+        if cursor is not None:
+            statement = statement.where(after_cursor(cursor))
+        # newest first, uid breaks ties between rows of the same second
+        return statement.order_by(YoloOutput.created_at.desc(), YoloOutput.uid.desc())
+
+    def get_history_admin_statement(self, email: str | None = None, **filters):
         statement = select(
+            YoloOutput.uid,
             User.username,
             User.email,
             YoloOutput.sample_name,
             YoloOutput.total_objects,
             YoloOutput.created_at,
         ).join(User, YoloOutput.user_id == User.uid)
+        if email is not None:
+            statement = statement.where(User.email == email)
+        return self.filter_history(statement, **filters)
 
-        results = await session.exec(statement)
-        data = results.all()
-        return data
+    async def get_history_admin(
+        self,
+        session: AsyncSession,
+        limit: int,
+        cursor: str | None = None,
+        email: str | None = None,
+        **filters,
+    ) -> tuple[list, str | None]:
+        statement = self.get_history_admin_statement(
+            email=email, cursor=cursor, **filters
+        )
+
+        # one row past the page tells whether there is a next one
+        results = await session.exec(statement.limit(limit + 1))
+        return next_page(results.all(), limit)
 
-    async def get_history_user(self, email: str, session: AsyncSession):
-        user_statement = select(User).where(User.email == email)
+    async def get_history_user(
+        self,
+        email: str,
+        session: AsyncSession,
+        limit: int,
+        cursor: str | None = None,
+        **filters,
+    ) -> tuple[list, str | None] | None:
+        user_statement = select(User.uid).where(User.email == email)
         result_user = await session.exec(user_statement)
-        user = result_user.first()
+        user_id = result_user.first()
 
-        if not user:
+        if not user_id:
             return None
 
-        statement_main = select(YoloOutput).where(YoloOutput.user_id == user.uid)
-        results_main = await session.exec(statement_main)
-        data = results_main.all()
+        statement_main = select(
+            YoloOutput.uid,
+            YoloOutput.sample_name,
+            YoloOutput.total_objects,
+            YoloOutput.created_at,
+        ).where(YoloOutput.user_id == user_id)
+        statement_main = self.filter_history(statement_main, cursor=cursor, **filters)
+        results_main = await session.exec(statement_main.limit(limit + 1))
+
+        return next_page(results_main.all(), limit)
+
+    async def get_detection_stats(
+        self, session: AsyncSession, group_by: list[str], **filters
+    ) -> list[dict]:
+        results = await session.exec(stats_statement(group_by, **filters))
+        stats = []
+        for row in results.mappings():
+            row = dict(row)
+            # SUM() comes back as a Decimal from MySQL
+            row["total_objects_sum"] = int(row["total_objects_sum"])
+            row["output_count"] = int(row["output_count"])
+            row["total_objects_mean"] = row["total_objects_sum"] / row["output_count"]
+            stats.append(row)
+        return stats
 
-        return data
+    async def get_detections(
+        self, session: AsyncSession, uid: uuid.UUID, user_id: uuid.UUID | None = None
+    ):
+        statement = select(
+            YoloOutput.uid,
+            YoloOutput.sample_name,
+            YoloOutput.total_objects,
+            YoloOutput.created_at,
+            YoloOutput.detections,
+        ).where(YoloOutput.uid == uid)
+        # users only see their own outputs, admins pass no user_id
+        if user_id is not None:
+            statement = statement.where(YoloOutput.user_id == user_id)
+        results = await session.exec(statement)
+        return results.first()
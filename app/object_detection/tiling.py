@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+
+from app.object_detection.results import DetectionResult
+
+
+def tile_starts(length: int, tile: int, stride: int) -> list[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    # The last tile is aligned with the image border
+    starts.append(length - tile)
+    return starts
+
+
+def make_tiles(
+    width: int, height: int, tile_size: int, overlap: float, max_tiles: int
+) -> list[tuple[int, int, int, int]]:
+    """Return overlapping (xmin, ymin, xmax, ymax) tiles covering the image.
+
+    When the grid would exceed `max_tiles`, the tiles are enlarged (and thus
+    downscaled by the model to `tile_size`) until it fits, so cost stays
+    bounded on very large images.
+    """
+    tile = tile_size
+    while True:
+        stride = max(1, int(tile * (1 - overlap)))
+        xs = tile_starts(width, tile, stride)
+        ys = tile_starts(height, tile, stride)
+        if len(xs) * len(ys) <= max_tiles:
+            break
+        tile = math.ceil(tile * 1.25)
+
+    return [(x, y, min(x + tile, width), min(y + tile, height)) for y in ys for x in xs]
+
+
+def non_max_suppression(
+    boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, iou_threshold: float
+) -> np.ndarray:
+    """Class-aware NMS, returns the indices of the kept boxes by score."""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Shift every class to its own coordinate range so classes never overlap
+    offsets = class_ids.astype(np.float32)[:, None] * (boxes.max() + 1)
+    shifted = boxes + offsets
+    areas = (shifted[:, 2] - shifted[:, 0]) * (shifted[:, 3] - shifted[:, 1])
+
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(shifted[i, 0], shifted[rest, 0])
+        yy1 = np.maximum(shifted[i, 1], shifted[rest, 1])
+        xx2 = np.minimum(shifted[i, 2], shifted[rest, 2])
+        yy2 = np.minimum(shifted[i, 3], shifted[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def merge_tile_results(
+    results: list[DetectionResult],
+    tiles: list[tuple[int, int, int, int]],
+    names: dict,
+    iou_threshold: float,
+) -> DetectionResult:
+    """Move tile detections back to image coordinates and drop duplicates."""
+    boxes = [
+        result.boxes + np.array([x, y, x, y], dtype=np.float32)
+        for result, (x, y, _, _) in zip(results, tiles)
+    ]
+    boxes = np.concatenate(boxes) if boxes else np.empty((0, 4), dtype=np.float32)
+    conf = np.concatenate([result.conf for result in results])
+    class_ids = np.concatenate([result.cls for result in results])
+
+    keep = non_max_suppression(boxes, conf, class_ids, iou_threshold)
+    return DetectionResult(boxes[keep], conf[keep], class_ids[keep], names)
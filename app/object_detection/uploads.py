@@ -0,0 +1,117 @@
+import io
+import zipfile
+from pathlib import PurePosixPath
+from typing import BinaryIO
+
+from fastapi import UploadFile
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+class BatchUploadError(ValueError):
+    """Raised when a batch upload can not be turned into a list of images."""
+
+
+def take_upload_file(upload: UploadFile) -> BinaryIO:
+    # FastAPI closes uploads once the endpoint returns, before a streaming
+    # response is sent. Detach the spooled file so the stream keeps reading it.
+    source = upload.file
+    upload.file = io.BytesIO()
+    return source
+
+
+class ZipMember:
+    """An image inside an uploaded zip, only inflated when it is read."""
+
+    def __init__(
+        self, source: BinaryIO, archive: zipfile.ZipFile, info: zipfile.ZipInfo
+    ) -> None:
+        self.source = source
+        self.archive = archive
+        self.info = info
+
+    def read(self) -> bytes:
+        return self.archive.read(self.info)
+
+    def close(self) -> None:
+        # Every member of the archive closes it, closing twice is harmless
+        self.archive.close()
+        self.source.close()
+
+
+def open_image(source: BinaryIO | ZipMember) -> BinaryIO:
+    if isinstance(source, ZipMember):
+        return io.BytesIO(source.read())
+    return source
+
+
+def is_zip_upload(upload: UploadFile) -> bool:
+    return upload.content_type in (
+        "application/zip",
+        "application/x-zip-compressed",
+    ) or (upload.filename or "").lower().endswith(".zip")
+
+
+def expand_batch_uploads(
+    uploads: list[UploadFile], max_images: int, max_image_bytes: int
+) -> list[tuple[str, BinaryIO | ZipMember]]:
+    """Return (filename, file) pairs for every image in multipart files or zips."""
+    images = []
+    try:
+        for upload in uploads:
+            source = take_upload_file(upload)
+            if is_zip_upload(upload):
+                images.extend(
+                    read_zip_images(
+                        source,
+                        upload.filename,
+                        max_images - len(images),
+                        max_image_bytes,
+                    )
+                )
+            else:
+                images.append((upload.filename or f"image_{len(images)}", source))
+            if len(images) > max_images:
+                raise BatchUploadError(
+                    f"A batch can contain at most {max_images} images"
+                )
+    except BatchUploadError:
+        for _, source in images:
+            source.close()
+        raise
+    return images
+
+
+def read_zip_images(
+    source: BinaryIO, filename: str | None, max_images: int, max_image_bytes: int
+) -> list[tuple[str, ZipMember]]:
+    """List the images of a zip, they are inflated one chunk at a time later."""
+    images = []
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        source.close()
+        raise BatchUploadError(f"{filename} is not a valid zip archive")
+    try:
+        for member in archive.infolist():
+            name = PurePosixPath(member.filename)
+            if member.is_dir() or name.suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            # Check the declared size, zipfile never inflates more than that
+            if member.file_size > max_image_bytes:
+                raise BatchUploadError(
+                    f"{member.filename} exceeds {max_image_bytes} bytes"
+                )
+            if len(images) >= max_images:
+                raise BatchUploadError(
+                    f"{filename} has more images than a batch allows"
+                )
+            images.append((name.name, ZipMember(source, archive, member)))
+    except BatchUploadError:
+        archive.close()
+        source.close()
+        raise
+    if not images:
+        archive.close()
+        source.close()
+    return images
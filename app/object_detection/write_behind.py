@@ -0,0 +1,198 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime
+
+import orjson
+from loguru import logger
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy.exc import IntegrityError
+
+from app.db.models import YoloOutput
+from app.db.redis import redis_client
+from app.db.session import AsyncSessionLocal
+
+PENDING_STREAM = "yolo_outputs:pending"
+DEAD_LETTER_STREAM = "yolo_outputs:dead"
+WRITERS_GROUP = "yolo_outputs_writers"
+
+
+def encode_output(yolo_output: YoloOutput) -> dict:
+    fields = {
+        "data": orjson.dumps(
+            {
+                "uid": str(yolo_output.uid),
+                "user_id": str(yolo_output.user_id),
+                "sample_name": yolo_output.sample_name,
+                "total_objects": yolo_output.total_objects,
+                "created_at": yolo_output.created_at.isoformat(),
+            }
+        )
+    }
+    # packed boxes stay binary, next to the JSON record
+    if yolo_output.detections is not None:
+        fields["detections"] = yolo_output.detections
+    return fields
+
+
+def decode_output(fields: dict) -> YoloOutput:
+    record = orjson.loads(fields[b"data"])
+    return YoloOutput(
+        uid=uuid.UUID(record["uid"]),
+        user_id=uuid.UUID(record["user_id"]),
+        sample_name=record["sample_name"],
+        total_objects=record["total_objects"],
+        detections=fields.get(b"detections"),
+        created_at=datetime.fromisoformat(record["created_at"]),
+    )
+
+
+class YoloOutputWriteBehind:
+    """Buffers YoloOutput records in a Redis stream and inserts them in batches.
+
+    A record counts as saved once it is in the stream, Redis keeps it (with
+    AOF persistence) until a flush has committed it to MySQL and acknowledged
+    it. Every web worker flushes with its own consumer in one group, entries
+    left pending by a worker that died are claimed by the others after
+    `claim_idle_ms`. Redelivered records are skipped by uid, so a crash
+    between commit and acknowledgement does not insert them twice.
+    """
+
+    def __init__(
+        self,
+        save_outputs,
+        batch_size: int,
+        flush_interval_ms: int,
+        claim_idle_ms: int,
+    ) -> None:
+        self.save_outputs = save_outputs
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.claim_idle_ms = claim_idle_ms
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    async def submit(self, yolo_outputs: list[YoloOutput]) -> None:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for yolo_output in yolo_outputs:
+                pipe.xadd(PENDING_STREAM, encode_output(yolo_output))
+            await pipe.execute()
+
+    async def start(self) -> None:
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        try:
+            await redis_client.xgroup_create(
+                PENDING_STREAM, WRITERS_GROUP, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what this worker has read, then leave the group."""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._task
+        self._task = None
+        try:
+            pending = await redis_client.xpending_range(
+                PENDING_STREAM, WRITERS_GROUP, "-", "+", 1, consumername=self.consumer
+            )
+            if not pending:
+                await redis_client.xgroup_delconsumer(
+                    PENDING_STREAM, WRITERS_GROUP, self.consumer
+                )
+        except RedisError as e:
+            logger.warning("Write-behind consumer not removed: {}", e)
+
+    async def _run(self) -> None:
+        # Entries read but not flushed yet, retried until they are committed
+        batch: list = []
+        while True:
+            try:
+                if not batch:
+                    batch = await self._claim_stale()
+                room = self.batch_size - len(batch)
+                if room > 0 and self._stopping:
+                    # Drain without waiting for more records
+                    batch += await self._read(room, None)
+                elif room > 0:
+                    batch += await self._collect(room)
+                if not batch:
+                    if self._stopping:
+                        return
+                    continue
+                await self._flush(batch)
+                batch = []
+            except Exception as e:
+                logger.warning("Write-behind flush of {} failed: {}", len(batch), e)
+                if self._stopping:
+                    # Left pending, another worker claims them once idle
+                    return
+                await asyncio.sleep(self.flush_interval)
+
+    async def _read(self, count: int, block_ms: int | None) -> list:
+        response = await redis_client.xreadgroup(
+            WRITERS_GROUP,
+            self.consumer,
+            {PENDING_STREAM: ">"},
+            count=count,
+            block=block_ms,
+        )
+        return response[0][1] if response else []
+
+    async def _collect(self, count: int) -> list:
+        # Wait until `count` records arrived or the flush interval is over
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        entries = []
+        while len(entries) < count and not self._stopping:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            entries += await self._read(
+                count - len(entries), max(1, int(remaining * 1000))
+            )
+        return entries
+
+    async def _claim_stale(self) -> list:
+        # Entries of workers that stopped without flushing them
+        response = await redis_client.xautoclaim(
+            PENDING_STREAM,
+            WRITERS_GROUP,
+            self.consumer,
+            min_idle_time=self.claim_idle_ms,
+            count=self.batch_size,
+        )
+        return response[1]
+
+    async def _flush(self, entries: list) -> None:
+        ids = [entry_id for entry_id, _ in entries]
+        records = [(i, fields) for i, fields in entries if fields]
+        yolo_outputs = [decode_output(fields) for _, fields in records]
+        try:
+            if yolo_outputs:
+                async with AsyncSessionLocal() as session:
+                    await self.save_outputs(session, yolo_outputs)
+        except IntegrityError:
+            # One bad record (e.g. its user was deleted) must not block the rest
+            await self._flush_one_by_one(records)
+
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.xack(PENDING_STREAM, WRITERS_GROUP, *ids)
+            pipe.xdel(PENDING_STREAM, *ids)
+            await pipe.execute()
+
+    async def _flush_one_by_one(self, records: list) -> None:
+        for _, fields in records:
+            try:
+                async with AsyncSessionLocal() as session:
+                    await self.save_outputs(session, [decode_output(fields)])
+            except IntegrityError as e:
+                logger.error("Dropping YoloOutput {}: {}", fields[b"data"], e.orig)
+                await redis_client.xadd(DEAD_LETTER_STREAM, fields)
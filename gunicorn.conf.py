@@ -0,0 +1,47 @@
+"""Gunicorn settings, used by default when started from the project root:
+
+    gunicorn app.main:app
+
+With MODEL_LOAD_MODE=preload the app, and with it the model weights, is
+imported once in the master and forked into the workers. PyTorch weights are
+fused before the fork and shared copy-on-write. ONNX Runtime and OpenVINO
+sessions own thread pools that do not survive a fork, so each worker still
+creates its own session on its first predict.
+"""
+
+import gc
+import os
+import sys
+
+from app.config import Config
+
+bind = "0.0.0.0:8000"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = Config.WEB_WORKERS
+preload_app = Config.MODEL_LOAD_MODE == "preload"
+# Loading the model takes longer than the default 30 seconds on small CPUs
+timeout = 120
+
+
+def inference_threads() -> int:
+    if Config.INFERENCE_THREADS_PER_WORKER:
+        return Config.INFERENCE_THREADS_PER_WORKER
+    return max(1, (os.cpu_count() or 1) // Config.WEB_WORKERS)
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the garbage collector's reach, so
+    # collections in the workers do not touch (and copy) the shared pages
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Keep the workers from oversubscribing the cores with torch threads. The
+    # master never ran inference, so torch's thread pool starts fresh here.
+    threads = str(inference_threads())
+    os.environ["OMP_NUM_THREADS"] = threads
+    os.environ["MKL_NUM_THREADS"] = threads
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(int(threads))
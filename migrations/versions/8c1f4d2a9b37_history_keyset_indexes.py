@@ -0,0 +1,29 @@
+"""History keyset indexes
+
+Revision ID: 8c1f4d2a9b37
+Revises: 5520767071ee
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1f4d2a9b37'
+down_revision: Union[str, None] = '5520767071ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_yolo_outputs_created_at_uid', 'yolo_outputs', ['created_at', 'uid'], unique=False)
+    op.create_index('ix_yolo_outputs_user_id_created_at_uid', 'yolo_outputs', ['user_id', 'created_at', 'uid'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_yolo_outputs_user_id_created_at_uid', table_name='yolo_outputs')
+    op.drop_index('ix_yolo_outputs_created_at_uid', table_name='yolo_outputs')
@@ -0,0 +1,48 @@
+"""Detection daily stats rollup
+
+Revision ID: d47a0e6b1c52
+Revises: 8c1f4d2a9b37
+Create Date: 2026-10-18 15:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd47a0e6b1c52'
+down_revision: Union[str, None] = '8c1f4d2a9b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'detection_daily_stats',
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('sample_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('output_count', sa.Integer(), nullable=False),
+        sa.Column('total_objects_sum', mysql.BIGINT(), nullable=False),
+        sa.Column('total_objects_max', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.uid']),
+        sa.PrimaryKeyConstraint('user_id', 'day', 'sample_name'),
+    )
+    op.create_index('ix_detection_daily_stats_day', 'detection_daily_stats', ['day'], unique=False)
+    # Fill the rollup from the outputs saved so far
+    op.execute(
+        "INSERT INTO detection_daily_stats "
+        "(user_id, day, sample_name, output_count, total_objects_sum, total_objects_max) "
+        "SELECT user_id, DATE(created_at), COALESCE(sample_name, ''), "
+        "COUNT(*), SUM(total_objects), MAX(total_objects) "
+        "FROM yolo_outputs GROUP BY user_id, DATE(created_at), COALESCE(sample_name, '')"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_detection_daily_stats_day', table_name='detection_daily_stats')
+    op.drop_table('detection_daily_stats')
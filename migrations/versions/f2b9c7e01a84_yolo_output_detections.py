@@ -0,0 +1,28 @@
+"""Yolo output detections
+
+Revision ID: f2b9c7e01a84
+Revises: d47a0e6b1c52
+Create Date: 2026-10-18 16:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b9c7e01a84'
+down_revision: Union[str, None] = 'd47a0e6b1c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('yolo_outputs', sa.Column('detections', mysql.MEDIUMBLOB(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('yolo_outputs', 'detections')
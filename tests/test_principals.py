@@ -0,0 +1,116 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.auth import principals
+from app.auth.principals import PrincipalCache
+from app.auth.schemas import PrincipalModel
+from app.db.models import User
+
+
+class FakePipeline:
+    def __init__(self, client: "FakeRedis") -> None:
+        self.client = client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def delete(self, key):
+        self.client.data.pop(key, None)
+
+    def incr(self, key):
+        self.client.data[key] = str(int(self.client.data.get(key, 0)) + 1).encode()
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, script):
+        # Only STORE_IF_CURRENT is registered by PrincipalCache
+        async def store_if_current(keys, args):
+            if self.data.get(keys[1], b"") != args[0]:
+                return 0
+            self.data[keys[0]] = args[1]
+            return 1
+
+        return store_if_current
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(principals, "redis_client", client)
+
+    async def publish_auth_event(event):
+        pass
+
+    monkeypatch.setattr(principals, "publish_auth_event", publish_auth_event)
+    return client
+
+
+def make_user() -> User:
+    return User(
+        uid=uuid.uuid4(),
+        username="johndoe",
+        email="johndoe@example.com",
+        first_name="John",
+        last_name="Doe",
+        role="user",
+        is_verified=True,
+        hashed_password="$2b$12$secret",
+        created_at=datetime(2025, 1, 1),
+    )
+
+
+@pytest.mark.asyncio
+async def test_set_get_round_trip(redis):
+    cache = PrincipalCache(max_entries=10, local_ttl=30, ttl=300)
+    user = make_user()
+    await cache.set(user, await cache.generation(str(user.uid)))
+
+    principal = await cache.get(str(user.uid))
+    assert isinstance(principal, PrincipalModel)
+    assert principal.uid == user.uid
+    assert principal.role == "user"
+    assert principal.is_verified
+
+    # Second tier, as seen by another worker
+    cache.forget(str(user.uid))
+    principal = await cache.get(str(user.uid))
+    assert principal.email == user.email
+    assert b"hashed_password" not in redis.data[f"principal:{user.uid}"]
+
+
+@pytest.mark.asyncio
+async def test_set_drops_user_read_before_invalidation(redis):
+    cache = PrincipalCache(max_entries=10, local_ttl=30, ttl=300)
+    user = make_user()
+    user_id = str(user.uid)
+
+    # The row is read, then the user is updated before it is cached
+    generation = await cache.generation(user_id)
+    await cache.invalidate(user.uid)
+    await cache.set(user, generation)
+    assert await cache.get(user_id) is None
+
+    # Read after the update, it is cached again
+    user.role = "admin"
+    await cache.set(user, await cache.generation(user_id))
+    assert (await cache.get(user_id)).role == "admin"
@@ -0,0 +1,81 @@
+import struct
+
+import numpy as np
+
+from app.object_detection.results import DetectionResult
+
+
+def make_result(names: dict) -> DetectionResult:
+    # Values exactly representable in float32
+    return DetectionResult(
+        boxes=np.array([[1.5, 2.0, 10.25, 20.5], [3.0, 4.0, 5.0, 6.0]], dtype="f4"),
+        conf=np.array([0.75, 0.5], dtype="f4"),
+        cls=np.array([3, 0], dtype="i2"),
+        names=names,
+    )
+
+
+def test_byte_layout():
+    result = make_result({0: "colony", 3: "mold", 7: "unused"})
+
+    # Stored rows depend on this layout, change it only with a migration
+    assert result.to_bytes() == b"".join(
+        (
+            struct.pack("<i", 2),
+            struct.pack("<8f", 1.5, 2.0, 10.25, 20.5, 3.0, 4.0, 5.0, 6.0),
+            struct.pack("<2f", 0.75, 0.5),
+            struct.pack("<2h", 3, 0),
+            b'{"0":"colony","3":"mold"}',
+        )
+    )
+
+
+def test_round_trip():
+    result = make_result({0: "colony", 3: "mold"})
+    loaded = DetectionResult.from_bytes(result.to_bytes())
+
+    assert len(loaded) == 2
+    np.testing.assert_array_equal(loaded.boxes, result.boxes)
+    np.testing.assert_array_equal(loaded.conf, result.conf)
+    np.testing.assert_array_equal(loaded.cls, result.cls)
+    assert loaded.names == {0: "colony", 3: "mold"}
+    assert loaded.class_names() == ["mold", "colony"]
+
+
+def test_round_trip_non_ascii_names():
+    result = make_result({0: "khuẩn lạc", 3: "nấm mốc"})
+    loaded = DetectionResult.from_bytes(result.to_bytes())
+
+    assert loaded.class_counts() == {"khuẩn lạc": 1, "nấm mốc": 1}
+    assert loaded.class_names() == ["nấm mốc", "khuẩn lạc"]
+
+
+def test_round_trip_without_detections():
+    result = DetectionResult(
+        boxes=np.empty((0, 4), dtype="f4"),
+        conf=np.empty(0, dtype="f4"),
+        cls=np.empty(0, dtype="i2"),
+        names={0: "colony"},
+    )
+    data = result.to_bytes()
+    assert data == struct.pack("<i", 0) + b"{}"
+
+    loaded = DetectionResult.from_bytes(data)
+    assert len(loaded) == 0
+    assert loaded.boxes.shape == (0, 4)
+    assert loaded.names == {}
+    assert loaded.class_counts() == {}
+
+
+def test_from_bytes_without_names():
+    # Rows stored before the class names were appended: count, two boxes,
+    # two confidences and two class ids
+    data = make_result({0: "colony", 3: "mold"}).to_bytes()[: 4 + 32 + 8 + 4]
+    loaded = DetectionResult.from_bytes(data)
+
+    assert loaded.names == {}
+    assert loaded.class_names() == ["3", "0"]
+    assert DetectionResult.from_bytes(data, names={0: "colony"}).class_names() == [
+        "3",
+        "colony",
+    ]